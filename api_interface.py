@@ -34,54 +34,110 @@ def heartbeat():
 @app.route('/status', methods=['GET'])
 def status():
     """
-    Возвращает статус сервиса
+    Возвращает статус сервиса и список обходов
     """
     logger.info(f'API: GET_status')
-    return flask.Response(status=200)
+    result = {
+        'status': 'UP',
+        'jobs': handler.get_statuses()
+    }
+    return flask.jsonify(result)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Возвращает метрики обходов в текстовом формате Prometheus
+    """
+    return flask.Response(handler.get_metrics(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/start', methods=['POST'])
 def calculate():
     """
-    Отправляет запрос на старт
+    Отправляет запрос на старт обхода.
+    Тело запроса: {"queries": [str], "users": [str], "groups": [str]}, вместо queries допускается "query": str.
+    Обход с контрольной точки продолжается по телу {"resume": job_id}
     """
     logger.info(f'API: POST_start')
-    handler.start()
+    body = flask.request.get_json(silent=True) or {}
+    if body.get('resume'):
+        try:
+            job = handler.resume(body['resume'])
+        except LookupError:
+            return flask.jsonify({'status': 'ERROR', 'message': 'checkpoint not found'}), 404
+        if job is None:
+            return flask.jsonify({'status': 'BUSY', 'message': 'too many running jobs'}), 429
+        return flask.jsonify({'status': 'UP', 'job_id': job.id})
+    queries = body.get('queries') or ([body['query']] if body.get('query') else [])
+    if not queries:
+        return flask.jsonify({'status': 'ERROR', 'message': 'queries are required'}), 400
+    job = handler.start(queries, body.get('users', []), body.get('groups', []))
+    if job is None:
+        return flask.jsonify({'status': 'BUSY', 'message': 'too many running jobs'}), 429
     result = {
-        "status": "UP"
+        "status": "UP",
+        "job_id": job.id
     }
     return flask.jsonify(result)
 
 
-# @app.route('/stop', methods=['POST'])
-# def stop():
-#     """
-#     Отправка запроса на остановку расчёта
-#     """
-#     logger.info(f'API: POST_stop')
-#     supervisor.stop(flask.request.json)
-#     return flask.Response(status=200)
-#
-#
-# @app.route('/status/<_config>/<_id>', methods=['GET'])
-# def get_calculation_status(_config, _id):
-#     """
-#     Возвращает текущие шаги расчёта
-#     """
-#     logger.info(f'API: GET_status; Config: {_config}; Identifier: {_id}')
-#     _status = 200
-#     data = supervisor.get_calculation_status(_config, _id)
-#     result = {
-#         'result': 1,
-#         'data': data
-#     }
-#     if data is None:
-#         _status = 404
-#         result = {
-#             'result': 0,
-#             'data': dict()
-#         }
-#     return flask.jsonify(result), _status
+@app.route('/checkpoints', methods=['GET'])
+def checkpoints():
+    """
+    Возвращает обходы с сохраненными контрольными точками
+    """
+    logger.info(f'API: GET_checkpoints')
+    return flask.jsonify({'result': 1, 'data': handler.get_checkpoints()})
+
+
+@app.route('/search', methods=['GET'])
+def search():
+    """
+    Ищет посты по полному тексту, сохраненному при FULL_TEXT_STORE=1.
+    Параметры: q - поисковый запрос, limit - количество постов, owner_id - владелец
+    """
+    logger.info(f'API: GET_search')
+    query = flask.request.args.get('q', '').strip()
+    if not query:
+        return flask.jsonify({'result': 0, 'message': 'q is required'}), 400
+    limit = min(flask.request.args.get('limit', 100, type=int), 1000)
+    owner_id = flask.request.args.get('owner_id', type=int)
+    return flask.jsonify({'result': 1, 'data': handler.search(query, limit, owner_id)})
+
+
+@app.route('/stop', methods=['POST'])
+def stop():
+    """
+    Отправка запроса на остановку обхода
+    """
+    logger.info(f'API: POST_stop')
+    body = flask.request.get_json(silent=True) or {}
+    job = handler.stop(body.get('job_id'))
+    if job is None:
+        return flask.jsonify({'result': 0}), 404
+    return flask.jsonify({'result': 1, 'data': job.to_dict()})
+
+
+@app.route('/status/<_id>', methods=['GET'])
+def get_calculation_status(_id):
+    """
+    Возвращает статус и прогресс обхода
+    """
+    logger.info(f'API: GET_status; Identifier: {_id}')
+    _status = 200
+    data = handler.get_status(_id)
+    result = {
+        'result': 1,
+        'data': data
+    }
+    if data is None:
+        _status = 404
+        result = {
+            'result': 0,
+            'data': dict()
+        }
+    return flask.jsonify(result), _status
 
 
 if __name__ == '__main__':
@@ -0,0 +1,138 @@
+"""
+Сквозной бенчмарк обхода стен без обращения к vk api.
+
+Поднимает локальную замену vk api (fake_vk.py), запускает AppManager.run на синтетических стенах
+и выводит посты в секунду, пиковый RSS и время по стадиям: запросы к api, разбор страниц, запись в базу.
+
+Запуск: python benchmarks/bench_crawl.py --url sqlite:///bench_crawl.sqlite3 --groups 20 --wall-size 1000
+"""
+import argparse
+import os
+import resource
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='sqlite:///bench_crawl.sqlite3')
+    parser.add_argument('--queries', nargs='+', default=['bench'])
+    parser.add_argument('--users', type=int, default=0)
+    parser.add_argument('--groups', type=int, default=10)
+    parser.add_argument('--wall-size', type=int, default=500)
+    parser.add_argument('--photo-rate', type=float, default=0.5)
+    parser.add_argument('--video-rate', type=float, default=0.1)
+    parser.add_argument('--link-rate', type=float, default=0.2)
+    parser.add_argument('--history-depth', type=int, default=0)
+    parser.add_argument('--repost-rate', type=float, default=0.2)
+    parser.add_argument('--repost-owners', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--http-error-rate', type=float, default=0.0)
+    parser.add_argument('--tokens', type=int, default=3)
+    parser.add_argument('--rate', type=float, default=1000, help='запросов в секунду на ключ')
+    parser.add_argument('--write-mode', default='bulk', choices=('orm', 'bulk', 'upsert'))
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+def configure_env(args: argparse.Namespace) -> None:
+    """
+    Настройки приложения читаются при импорте config, поэтому задаются до импорта модулей приложения
+    """
+    os.environ['VK_SERVICE_ACCESS_TOKEN'] = ','.join(f'bench-token-{i}' for i in range(args.tokens))
+    os.environ['VK_TRANSPORT'] = 'async'
+    os.environ['VK_RATE_LIMIT'] = str(args.rate)
+    os.environ['VK_RATE_BURST'] = str(args.rate)
+    os.environ['VK_RETRY_BASE_DELAY'] = '0.01'
+    os.environ['VK_RETRY_MAX_DELAY'] = '0.1'
+    os.environ['CRAWL_MODE'] = 'full'
+    os.environ['DB_URL'] = args.url
+    os.environ['DB_WRITE_MODE'] = args.write_mode
+    os.environ.setdefault('LOG_LEVEL', 'INFO')
+
+
+class StageTimer:
+    """
+    Суммирует время вызовов обернутых методов по стадиям
+    """
+
+    def __init__(self):
+        self.totals = {}
+
+    def wrap(self, stage: str, func):
+        self.totals.setdefault(stage, 0.0)
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.totals[stage] += perf_counter() - start
+        return timed
+
+
+def peak_rss_mb() -> float:
+    """
+    Пиковый RSS процесса, ru_maxrss в Linux - в килобайтах, в macOS - в байтах
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def main():
+    args = parse_args()
+    configure_env(args)
+
+    from config import AppConfig
+    from executors import DataExecutor
+    from manager import AppManager
+    from models import Base
+    from vk_client import AsyncVkClient
+    from fake_vk import FakeVkServer, WallConfig
+
+    executor = DataExecutor(args.url)
+    Base.metadata.drop_all(executor.engine)
+    Base.metadata.create_all(executor.engine)
+    executor.engine.dispose()
+
+    server = FakeVkServer(WallConfig(
+        wall_size=args.wall_size, photo_rate=args.photo_rate, video_rate=args.video_rate, link_rate=args.link_rate,
+        history_depth=args.history_depth, repost_rate=args.repost_rate, repost_owners=args.repost_owners,
+        latency=args.latency, error_rate=args.error_rate, http_error_rate=args.http_error_rate, seed=args.seed
+    ))
+    server.start()
+    AsyncVkClient.api_url = server.url
+
+    try:
+        manager = AppManager(AppConfig.get_vk_api_version(), AppConfig.get_vk_access_tokens(), args.queries)
+        timer = StageTimer()
+        manager.parser.execute = timer.wrap('api', manager.parser.execute)
+        manager.parser.create_owner_posts = timer.wrap('parse', manager.parser.create_owner_posts)
+        users = [f'id{i}' for i in range(1, args.users + 1)]
+        groups = [f'club{i}' for i in range(1, args.groups + 1)]
+        start = perf_counter()
+        manager.run(users, groups)
+        elapsed = perf_counter() - start
+    finally:
+        server.stop()
+
+    metrics = manager.progress.metrics
+    posts_cnt = manager.progress.posts.value
+    print(f'Driver: {manager.executor.engine.dialect.name}+{manager.executor.engine.dialect.driver}, '
+          f'write mode: {args.write_mode}')
+    print(f'Server requests: {server.requests_cnt}, injected errors: {server.errors_cnt}')
+    print(f'Posts: {posts_cnt}, photos: {metrics.created["photos"].value:.0f}, '
+          f'videos: {metrics.created["videos"].value:.0f}, pages: {manager.progress.pages.value}')
+    print(f'Total: {elapsed:.2f} s, {posts_cnt / elapsed:.0f} posts/s, peak RSS: {peak_rss_mb():.1f} MB')
+    print(f'API: {timer.totals["api"]:.2f} s, parse: {timer.totals["parse"]:.2f} s, '
+          f'DB: {metrics.db_flush_seconds.sum:.2f} s in {metrics.db_flush_seconds.count:.0f} flushes')
+    if metrics.db_pool_wait_seconds.count:
+        print(f'DB pool: {metrics.db_pool_wait_seconds.count:.0f} checkouts, '
+              f'wait {metrics.db_pool_wait_seconds.sum:.3f} s, timeouts {metrics.db_pool_timeouts.value:.0f}')
+
+
+if __name__ == '__main__':
+    main()
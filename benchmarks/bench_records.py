@@ -0,0 +1,127 @@
+"""
+Сравнение разбора страниц в записи (records.py) и в объекты моделей SQLAlchemy.
+
+Страницы разбираются методами ApiParser, вариант ORM дополнительно строит объекты моделей из записей,
+как это делал парсер до перехода на записи. Выводятся посты в секунду и выделенная память по tracemalloc.
+
+Запуск: python benchmarks/bench_records.py --posts 50000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from threading import RLock
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from channel import parse_wall_item
+from executors import ApiParser, DataExecutor, SearchOwner, WallCursor
+from jobs import JobProgress
+from logger import ParserLogger
+from records import to_model
+from registry import OwnerRegistry
+from matcher import TextMatcher
+
+
+def make_items(posts_cnt: int, seed: int) -> list[dict]:
+    """
+    Генерирует посты в формате ответа wall.search с вложениями и репостами
+    """
+    rnd = random.Random(seed)
+    items = []
+    for i in range(1, posts_cnt + 1):
+        owner_id = -(i % 100 + 1)
+        date = 1_700_000_000 + i * 60
+        post = {
+            'id': i, 'owner_id': owner_id, 'from_id': owner_id, 'date': date, 'post_type': 'post',
+            'text': 'Synthetic post about bench ' + 'lorem ipsum ' * rnd.randint(0, 40),
+            'views': {'count': i}, 'likes': {'count': 1}, 'comments': {'count': 0}, 'reposts': {'count': 0},
+            'attachments': [
+                {'type': 'photo', 'photo': {'id': i, 'owner_id': owner_id, 'date': date, 'text': '',
+                                            'sizes': [{'width': 604, 'url': 'https://example.com/photo.jpg'}]}},
+                {'type': 'link', 'link': {'url': 'https://example.com', 'title': 'title', 'description': 'bench'}}
+            ]
+        }
+        if i % 5 == 0:
+            post['attachments'].append({'type': 'video', 'video': {
+                'id': i, 'owner_id': owner_id, 'date': date, 'title': 'video', 'views': 1, 'duration': 10
+            }})
+        if i % 10 == 0:
+            source = dict(post, id=i, owner_id=-1_000_000, from_id=-1_000_000)
+            source.pop('attachments')
+            post['copy_history'] = [source]
+        items.append(post)
+    return items
+
+
+def make_parser() -> ApiParser:
+    """
+    Создает парсер без подключения к базе и vk api, только с состоянием, нужным для разбора страниц
+    """
+    parser = ApiParser.__new__(ApiParser)
+    parser.logger = ParserLogger()
+    parser.progress = JobProgress()
+    parser.metrics = parser.progress.metrics
+    parser.state_lock = RLock()
+    parser.domain = 'https://vk.com/'
+    parser.queries = ['bench']
+    parser.matcher = TextMatcher(parser.queries)
+    parser.marks = {}
+    parser.search_owners = OwnerRegistry()
+    parser.indexes = {name: DataExecutor.empty_dedup_index(name) for name in DataExecutor.dedup_models}
+    parser.claims = {name: {} for name in parser.indexes}
+    parser.post_index = parser.indexes['posts']
+    parser.photo_index = parser.indexes['photos']
+    parser.video_index = parser.indexes['videos']
+    parser.post_query_index = parser.indexes['post_queries']
+    parser.posts = []
+    parser.post_queries = []
+    parser.ext_user_ids = []
+    parser.ext_group_ids = []
+    return parser
+
+
+def run(items: list[dict], page_size: int, build_models: bool) -> tuple[float, int, int]:
+    """
+    Разбирает страницы и возвращает время, текущую и пиковую память
+    """
+    parser = make_parser()
+    owner = SearchOwner(_id=-1, domain='club1', _type='group', first_name='bench', is_closed=False)
+    cursor = WallCursor(owner, 'bench', 1)
+    gc.collect()
+    tracemalloc.start()
+    start = perf_counter()
+    for offset in range(0, len(items), page_size):
+        parser.create_owner_posts(cursor, items[offset:offset + page_size], None)
+    result = parser.posts + parser.post_queries
+    if build_models:
+        result = [to_model(record) for record in result]
+    elapsed = perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=50_000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    items = [parse_wall_item(item) for item in make_items(args.posts, args.seed)]
+    results = {}
+    for name, build_models in (('records', False), ('orm', True)):
+        elapsed, current, peak = run(items, args.page_size, build_models)
+        results[name] = elapsed
+        print(f'{name:8} {elapsed:.2f} s, {args.posts / elapsed:.0f} posts/s, '
+              f'retained {current / 1024 / 1024:.1f} MB, peak {peak / 1024 / 1024:.1f} MB')
+    print(f'Speedup: {results["orm"] / results["records"]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
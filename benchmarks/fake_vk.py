@@ -0,0 +1,179 @@
+"""
+Локальная замена vk api для бенчмарков.
+
+Отвечает на execute со скриптами из вызовов wall.search, users.get и groups.getById,
+стены генерируются детерминированно по seed, размеру стены и набору вложений.
+"""
+import ast
+import asyncio
+import random
+import threading
+import zlib
+from dataclasses import dataclass
+
+from aiohttp import web
+
+
+@dataclass
+class WallConfig:
+    """
+    Параметры синтетических стен и поведения сервера
+    """
+    wall_size: int = 500
+    photo_rate: float = 0.5
+    video_rate: float = 0.1
+    link_rate: float = 0.2
+    history_depth: int = 0
+    repost_rate: float = 0.2
+    repost_owners: int = 10
+    repost_owner_offset: int = 1_000_000
+    latency: float = 0.05
+    jitter: float = 0.02
+    error_rate: float = 0.0
+    http_error_rate: float = 0.0
+    seed: int = 1
+
+
+def parse_calls(code: str) -> list[tuple[str, dict]]:
+    """
+    Разбирает скрипт execute вида return [API.method({...}), ...]; на список (метод, параметры)
+    """
+    calls = []
+    for chunk in code.split('API.')[1:]:
+        method, _, args = chunk.partition('(')
+        calls.append((method, ast.literal_eval(args[:args.rfind('})') + 1])))
+    return calls
+
+
+def parse_owner_id(value, prefix: str) -> int:
+    """
+    Возвращает id владельца по числу или короткому имени вида <prefix><id>
+    """
+    value = str(value)
+    if value.isdigit():
+        return int(value)
+    if value.startswith(prefix) and value[len(prefix):].isdigit():
+        return int(value[len(prefix):])
+    return zlib.crc32(value.encode()) % 1_000_000 + 1
+
+
+class FakeVkServer:
+    """
+    HTTP сервер в отдельном потоке с собственным циклом событий
+    """
+
+    def __init__(self, config: WallConfig, host: str = '127.0.0.1', port: int = 0):
+        self.config = config
+        self.host = host
+        self.port = port
+        self.requests_cnt = 0
+        self.errors_cnt = 0
+        self._random = random.Random(config.seed)
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}/method/'
+
+    def start(self) -> None:
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _start(self) -> None:
+        app = web.Application()
+        app.router.add_post('/method/{method}', self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def handle(self, request: web.Request) -> web.Response:
+        config = self.config
+        self.requests_cnt += 1
+        await asyncio.sleep(max(0.0, config.latency + self._random.uniform(-config.jitter, config.jitter)))
+        if self._random.random() < config.http_error_rate:
+            self.errors_cnt += 1
+            return web.Response(status=500)
+        if self._random.random() < config.error_rate:
+            self.errors_cnt += 1
+            return web.json_response({'error': {'error_code': 6, 'error_msg': 'Too many requests per second'}})
+        data = await request.post()
+        if request.match_info['method'] != 'execute':
+            return web.json_response({'error': {'error_code': 3, 'error_msg': 'Unknown method passed'}})
+        return web.json_response({'response': [self.call(method, args) for method, args in parse_calls(data['code'])]})
+
+    def call(self, method: str, args: dict):
+        if method == 'wall.search':
+            return self.wall_search(args['domain'], args['query'], args['count'], args['offset'])
+        if method == 'users.get':
+            return [self.user(parse_owner_id(user_id, 'id')) for user_id in args['user_ids']]
+        if method == 'groups.getById':
+            return {'groups': [self.group(parse_owner_id(group_id, 'club')) for group_id in args['group_ids']],
+                    'profiles': []}
+        return None
+
+    @staticmethod
+    def user(user_id: int) -> dict:
+        return {'id': user_id, 'domain': f'id{user_id}', 'first_name': 'User', 'last_name': str(user_id),
+                'is_closed': False, 'can_access_closed': True}
+
+    @staticmethod
+    def group(group_id: int) -> dict:
+        return {'id': group_id, 'screen_name': f'club{group_id}', 'name': f'Group {group_id}', 'is_closed': 0}
+
+    def wall_search(self, domain: str, query: str, count: int, offset: int) -> dict:
+        """
+        Возвращает страницу стены, посты нумеруются от новых к старым
+        """
+        owner_id = -parse_owner_id(domain, 'club') if domain.startswith('club') else parse_owner_id(domain, 'id')
+        total = self.config.wall_size
+        items = [self.post(owner_id, total - index, query, self.config.history_depth)
+                 for index in range(offset, min(offset + count, total))]
+        return {'count': total, 'items': items}
+
+    def post(self, owner_id: int, post_id: int, query: str, history_depth: int) -> dict:
+        config = self.config
+        rnd = random.Random(hash((config.seed, owner_id, post_id)))
+        date = 1_700_000_000 + post_id * 600
+        post = {
+            'id': post_id,
+            'owner_id': owner_id,
+            'from_id': owner_id,
+            'date': date,
+            'post_type': 'post',
+            'text': f'Synthetic post {post_id} about {query} ' + 'lorem ipsum ' * rnd.randint(0, 40),
+            'views': {'count': rnd.randint(0, 100_000)},
+            'likes': {'count': rnd.randint(0, 1000)},
+            'comments': {'count': rnd.randint(0, 100)},
+            'reposts': {'count': rnd.randint(0, 100)}
+        }
+        attachments = []
+        if rnd.random() < config.photo_rate:
+            attachments.append({'type': 'photo', 'photo': {
+                'id': post_id, 'owner_id': owner_id, 'date': date, 'text': '',
+                'sizes': [{'width': width, 'url': f'https://example.com/{owner_id}_{post_id}_{width}.jpg'}
+                          for width in (130, 604, 1280)]
+            }})
+        if rnd.random() < config.video_rate:
+            attachments.append({'type': 'video', 'video': {
+                'id': post_id, 'owner_id': owner_id, 'date': date, 'title': f'Video {post_id}',
+                'description': 'video description', 'views': rnd.randint(0, 10_000), 'comments': 0, 'duration': 60
+            }})
+        if rnd.random() < config.link_rate:
+            attachments.append({'type': 'link', 'link': {
+                'url': f'https://example.com/{post_id}', 'title': f'Link {post_id}', 'description': 'link'
+            }})
+        if attachments:
+            post['attachments'] = attachments
+        if history_depth and config.repost_owners and rnd.random() < config.repost_rate:
+            source_id = -(config.repost_owner_offset + rnd.randrange(config.repost_owners))
+            post['copy_history'] = [self.post(source_id, post_id, query, history_depth - 1)]
+        return post
@@ -0,0 +1,237 @@
+from dataclasses import dataclass
+from queue import Queue, Full, Empty
+from threading import Lock
+from time import perf_counter
+
+
+@dataclass(slots=True)
+class LinkItem:
+    """
+    Вложение-ссылка поста
+    """
+    title: str
+    url: str
+    caption: str | None
+    description: str | None
+
+
+@dataclass(slots=True)
+class PhotoItem:
+    """
+    Вложение-фотография поста, url - самый крупный размер
+    """
+    id: int
+    owner_id: int
+    date: int
+    text: str
+    url: str
+
+
+@dataclass(slots=True)
+class VideoItem:
+    """
+    Вложение-видео поста
+    """
+    id: int
+    owner_id: int
+    date: int
+    title: str
+    description: str | None
+    views: int | None
+    comments: int | None
+    duration: int | None
+
+
+@dataclass(slots=True)
+class WallItem:
+    """
+    Пост из ответа wall.search только с полями, которые нужны парсеру
+    """
+    id: int
+    owner_id: int
+    from_id: int
+    date: int
+    type: str | None
+    text: str | None
+    views: int | None
+    likes: int | None
+    comments: int | None
+    reposts: int | None
+    attachments: list
+    copy_history: list
+
+
+def counter_value(post: dict, name: str) -> int | None:
+    return post[name]['count'] if name in post else None
+
+
+def parse_attachment(attachment: dict):
+    """
+    Возвращает вложение поста или None для неподдерживаемых типов
+    """
+    if attachment['type'] == 'link':
+        link = attachment['link']
+        return LinkItem(title=link['title'], url=link['url'], caption=link.get('caption'),
+                        description=link.get('description'))
+    if attachment['type'] == 'photo':
+        photo = attachment['photo']
+        url = photo['orig_photo']['url'] if 'orig_photo' in photo \
+            else max(photo['sizes'], key=lambda size: size['width'])['url']
+        return PhotoItem(id=photo['id'], owner_id=photo['owner_id'], date=photo['date'], text=photo['text'], url=url)
+    if attachment['type'] == 'video':
+        video = attachment['video']
+        return VideoItem(id=video['id'], owner_id=video['owner_id'], date=video['date'], title=video['title'],
+                         description=video.get('description'), views=video.get('views'),
+                         comments=video.get('comments'), duration=video.get('duration'))
+    return None
+
+
+def parse_wall_item(post: dict) -> WallItem:
+    """
+    Преобразует пост из ответа vk api, остальные поля ответа отбрасываются
+    """
+    attachments = [parse_attachment(attachment) for attachment in post.get('attachments') or ()]
+    return WallItem(
+        id=post['id'],
+        owner_id=post['owner_id'],
+        from_id=post['from_id'],
+        date=post['date'],
+        type=post.get('post_type'),
+        text=post['text'],
+        views=counter_value(post, 'views'),
+        likes=counter_value(post, 'likes'),
+        comments=counter_value(post, 'comments'),
+        reposts=counter_value(post, 'reposts'),
+        attachments=[attachment for attachment in attachments if attachment is not None],
+        copy_history=[parse_wall_item(source) for source in post.get('copy_history') or ()]
+    )
+
+
+@dataclass(slots=True)
+class PageMessage:
+    """
+    Страница постов одного курсора, offset - смещение курсора после этой страницы
+    """
+    cursor: object
+    items: list[WallItem]
+    offset: int = 0
+
+
+@dataclass(slots=True)
+class ErrorMessage:
+    """
+    Поставщик страниц завершился с ошибкой
+    """
+    error: BaseException
+
+
+class EndOfStream:
+    """
+    Поставщик страниц завершил работу
+    """
+    __slots__ = ()
+
+
+END_OF_STREAM = EndOfStream()
+
+
+class PageChannel:
+    """
+    Ограниченный канал страниц между парсером и менеджером.
+    Поставщик блокируется, когда потребитель отстает, время ожидания и глубина очереди учитываются
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._queue = Queue(maxsize=maxsize)
+        self._lock = Lock()
+        self._closed = False
+        self._aborted = False
+        self.pages_cnt = 0
+        self.max_depth = 0
+        self.put_wait = 0.0
+        self.get_wait = 0.0
+
+    def _put(self, message) -> None:
+        """
+        Кладет сообщение в очередь, пока потребитель не прервал чтение
+        """
+        start = perf_counter()
+        while not self._aborted:
+            try:
+                self._queue.put(message, timeout=1)
+                break
+            except Full:
+                continue
+        self.put_wait += perf_counter() - start
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def put_page(self, cursor, items: list[WallItem], offset: int = 0) -> None:
+        """
+        Передает страницу постов потребителю
+        """
+        self.pages_cnt += 1
+        self._put(PageMessage(cursor, items, offset))
+
+    def close(self) -> None:
+        """
+        Сообщает об окончании потока страниц, повторный вызов ничего не делает
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._put(END_OF_STREAM)
+
+    def fail(self, error: BaseException) -> None:
+        """
+        Сообщает об ошибке поставщика и закрывает канал
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._put(ErrorMessage(error))
+
+    def abort(self) -> None:
+        """
+        Потребитель прекращает чтение, поставщик больше не блокируется
+        """
+        self._aborted = True
+        while True:
+            try:
+                self._queue.get_nowait()
+            except Empty:
+                break
+
+    def get(self):
+        """
+        Возвращает следующее сообщение
+        """
+        start = perf_counter()
+        message = self._queue.get()
+        self.get_wait += perf_counter() - start
+        return message
+
+    def task_done(self) -> None:
+        """
+        Потребитель сообщает, что страница разобрана
+        """
+        self._queue.task_done()
+
+    def drain(self) -> None:
+        """
+        Ждет, пока потребитель разберет все переданные страницы или прервет чтение
+        """
+        start = perf_counter()
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks and not self._aborted:
+                self._queue.all_tasks_done.wait(timeout=1)
+        self.put_wait += perf_counter() - start
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def report(self) -> str:
+        return (f'Channel: pages {self.pages_cnt}, capacity {self.maxsize}, max depth {self.max_depth}, '
+                f'producer wait {self.put_wait:.1f} s, consumer wait {self.get_wait:.1f} s')
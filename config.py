@@ -25,6 +25,21 @@ class AppConfig:
     # Директория с логами
     __LOG_DIR = os.path.dirname(os.path.abspath(sys.modules['__main__'].__name__))
 
+    # Уровень логирования по умолчанию
+    __LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+    # Уровни отдельных логгеров, через запятую: parser_log=INFO,api_log=WARNING
+    __LOG_LEVELS = dict(
+        (name.strip(), level.strip().upper())
+        for name, level in (item.split('=', 1) for item in os.environ.get('LOG_LEVELS', '').split(',') if '=' in item)
+    )
+
+    # Размер файла лога, после которого он архивируется, байт
+    __LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+
+    # Количество архивных файлов лога
+    __LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 14))
+
     # Префикс для подключения
     __BASE_CONFIG_PREFIX = get_run_prefix()
 
@@ -46,11 +61,121 @@ class AppConfig:
     # Пароль пользователя базы данных
     __USER_PWD = os.environ.get('DB_PASS')
 
+    # Строка подключения к базе данных целиком, заменяет DB_HOST, DB_PORT, VK_DB_NAME, DB_USER и DB_PASS
+    __DB_URL = os.environ.get('DB_URL')
+
     # Версия vk api
     __VK_API_VERSION = "5.199"
 
-    # Сервисный ключ доступа к vk api
-    __VK_ACCESS_TOKEN = os.environ.get('VK_SERVICE_ACCESS_TOKEN')
+    # Сервисные ключи доступа к vk api, через запятую
+    __VK_ACCESS_TOKENS = [token.strip() for token in os.environ.get('VK_SERVICE_ACCESS_TOKEN', '').split(',')
+                          if token.strip()]
+
+    # Количество запросов в секунду на один ключ доступа
+    __VK_RATE_LIMIT = float(os.environ.get('VK_RATE_LIMIT', 3))
+
+    # Допустимая пачка запросов сверх равномерного темпа на один ключ доступа
+    __VK_RATE_BURST = float(os.environ.get('VK_RATE_BURST', 3))
+
+    # Транспорт для запросов к vk api: async, sync
+    __VK_TRANSPORT = os.environ.get('VK_TRANSPORT', 'async')
+
+    # Количество одновременных запросов к vk api
+    __VK_CONCURRENCY = int(os.environ.get('VK_CONCURRENCY', 3))
+
+    # Максимальное количество вызовов api в одном скрипте execute
+    __VK_EXECUTE_MAX_CALLS = int(os.environ.get('VK_EXECUTE_MAX_CALLS', 25))
+
+    # Максимальный ожидаемый размер ответа одного скрипта execute, байт
+    __VK_EXECUTE_MAX_RESPONSE = int(os.environ.get('VK_EXECUTE_MAX_RESPONSE', 5000000))
+
+    # Оценка размера одного поста в ответе wall.search, байт
+    __VK_POST_SIZE_ESTIMATE = int(os.environ.get('VK_POST_SIZE_ESTIMATE', 2000))
+
+    # Максимальное количество попыток запроса к vk api
+    __VK_RETRY_ATTEMPTS = int(os.environ.get('VK_RETRY_ATTEMPTS', 5))
+
+    # Базовая задержка экспоненциального ожидания между попытками, сек
+    __VK_RETRY_BASE_DELAY = float(os.environ.get('VK_RETRY_BASE_DELAY', 0.5))
+
+    # Максимальная задержка между попытками, сек
+    __VK_RETRY_MAX_DELAY = float(os.environ.get('VK_RETRY_MAX_DELAY', 30))
+
+    # Количество ошибок одного класса подряд, после которого запросы приостанавливаются
+    __VK_BREAKER_THRESHOLD = int(os.environ.get('VK_BREAKER_THRESHOLD', 5))
+
+    # Время приостановки запросов после серии ошибок, сек
+    __VK_BREAKER_TIMEOUT = float(os.environ.get('VK_BREAKER_TIMEOUT', 30))
+
+    # Искать владельцев в таблице tOwners до запроса к vk api
+    __OWNER_CACHE_DB = os.environ.get('OWNER_CACHE_DB', '1') == '1'
+
+    # Количество символов текста до и после найденного запроса, которые сохраняются в посте
+    __TEXT_CONTEXT_WINDOW = int(os.environ.get('TEXT_CONTEXT_WINDOW', 15))
+
+    # Максимальное количество фрагментов текста с найденными запросами
+    __TEXT_MAX_FRAGMENTS = int(os.environ.get('TEXT_MAX_FRAGMENTS', 1))
+
+    # Искать слова запросов по основе, без окончаний
+    __TEXT_MATCH_STEM = os.environ.get('TEXT_MATCH_STEM', '1') == '1'
+
+    # Сохранять полный текст постов в tPostTexts для полнотекстового поиска
+    __FULL_TEXT_STORE = os.environ.get('FULL_TEXT_STORE', '0') == '1'
+
+    # Конфигурация текстового поиска PostgreSQL для tsvector
+    __FULL_TEXT_LANGUAGE = os.environ.get('FULL_TEXT_LANGUAGE', 'russian')
+
+    # Метод сжатия полного текста в PostgreSQL: pglz, lz4, пусто - по умолчанию сервера
+    __FULL_TEXT_COMPRESSION = os.environ.get('FULL_TEXT_COMPRESSION', '')
+
+    # На сколько месяцев вперед создаются секции tPosts, если таблица секционирована по дате
+    __POSTS_PARTITION_AHEAD = int(os.environ.get('POSTS_PARTITION_AHEAD', 3))
+
+    # Максимальное количество одновременно запущенных обходов
+    __MAX_JOBS = int(os.environ.get('MAX_JOBS', 2))
+
+    # Количество процессов, между которыми делятся владельцы одного обхода
+    __CRAWL_WORKERS = int(os.environ.get('CRAWL_WORKERS', 1))
+
+    # Режим обхода стен: full - с начала стены, incremental - до последнего сохраненного поста
+    __CRAWL_MODE = os.environ.get('CRAWL_MODE', 'full')
+
+    # Минимальный интервал между сохранениями контрольной точки обхода, сек
+    __CHECKPOINT_INTERVAL = float(os.environ.get('CHECKPOINT_INTERVAL', 30))
+
+    # Максимальное количество страниц в очереди между парсером и менеджером
+    __PAGE_QUEUE_SIZE = int(os.environ.get('PAGE_QUEUE_SIZE', 50))
+
+    # Количество постов в одной пачке записи в базу данных
+    __DB_BATCH_SIZE = int(os.environ.get('DB_BATCH_SIZE', 1000))
+
+    # Максимальное количество пачек, ожидающих записи в базу данных
+    __DB_WRITER_QUEUE_SIZE = int(os.environ.get('DB_WRITER_QUEUE_SIZE', 4))
+
+    # Способ записи в базу данных: orm, bulk, upsert
+    __DB_WRITE_MODE = os.environ.get('DB_WRITE_MODE', 'bulk')
+
+    # Количество постоянных соединений в пуле общего для процесса подключения к базе данных
+    __DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+
+    # Количество соединений сверх DB_POOL_SIZE, которые открываются при нехватке и закрываются после возврата
+    __DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+
+    # Время ожидания свободного соединения из пула в секундах
+    __DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+
+    # Время жизни соединения в секундах, после которого оно переоткрывается, -1 - без ограничения
+    __DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+
+    # Проверять соединение перед выдачей из пула
+    __DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+
+    # Ограничение времени выполнения запроса в PostgreSQL в миллисекундах, 0 - без ограничения
+    __DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 0))
+
+    # Количество выполнений запроса, после которого psycopg готовит его на сервере, -1 - не готовить
+    # (нужно при pgbouncer в режиме transaction)
+    __DB_PREPARE_THRESHOLD = int(os.environ.get('DB_PREPARE_THRESHOLD', 5))
 
     @classmethod
     def get_root_dir(cls):
@@ -66,6 +191,27 @@ class AppConfig:
         """
         return cls.__LOG_DIR
 
+    @classmethod
+    def get_log_level(cls, logger_name: str = None):
+        """
+        Возвращает уровень логгера из переменной класса __LOG_LEVELS или __LOG_LEVEL
+        """
+        return cls.__LOG_LEVELS.get(logger_name, cls.__LOG_LEVEL)
+
+    @classmethod
+    def get_log_max_bytes(cls):
+        """
+        Возвращает значение переменной класса __LOG_MAX_BYTES
+        """
+        return cls.__LOG_MAX_BYTES
+
+    @classmethod
+    def get_log_backup_count(cls):
+        """
+        Возвращает значение переменной класса __LOG_BACKUP_COUNT
+        """
+        return cls.__LOG_BACKUP_COUNT
+
     @classmethod
     def get_base_config_prefix(cls):
         """
@@ -115,6 +261,23 @@ class AppConfig:
         """
         return cls.__USER_PWD
 
+    @classmethod
+    def get_db_url(cls):
+        """
+        Возвращает значение переменной класса __DB_URL
+        """
+        return cls.__DB_URL
+
+    @classmethod
+    def get_connection_string(cls):
+        """
+        Возвращает строку подключения к базе данных из DB_URL или из параметров подключения
+        """
+        return cls.__DB_URL or (
+            f'{cls.__BASE_PROVIDER_NAME}://{cls.__USER_ID}:{cls.__USER_PWD}@'
+            f'{cls.__DB_HOST}:{cls.__DB_PORT}/{cls.__DB_NAME}'
+        )
+
     @classmethod
     def get_vk_api_version(cls):
         """
@@ -125,9 +288,261 @@ class AppConfig:
     @classmethod
     def get_vk_access_token(cls):
         """
-        Возвращает значение переменной класса __VK_ACCESS_TOKEN
+        Возвращает первый ключ из переменной класса __VK_ACCESS_TOKENS
+        """
+        return cls.__VK_ACCESS_TOKENS[0] if cls.__VK_ACCESS_TOKENS else None
+
+    @classmethod
+    def get_vk_access_tokens(cls):
+        """
+        Возвращает значение переменной класса __VK_ACCESS_TOKENS
+        """
+        return cls.__VK_ACCESS_TOKENS
+
+    @classmethod
+    def get_vk_rate_limit(cls):
+        """
+        Возвращает значение переменной класса __VK_RATE_LIMIT
+        """
+        return cls.__VK_RATE_LIMIT
+
+    @classmethod
+    def get_vk_rate_burst(cls):
+        """
+        Возвращает значение переменной класса __VK_RATE_BURST
+        """
+        return cls.__VK_RATE_BURST
+
+    @classmethod
+    def get_vk_transport(cls):
+        """
+        Возвращает значение переменной класса __VK_TRANSPORT
+        """
+        return cls.__VK_TRANSPORT
+
+    @classmethod
+    def get_vk_concurrency(cls):
+        """
+        Возвращает значение переменной класса __VK_CONCURRENCY
+        """
+        return cls.__VK_CONCURRENCY
+
+    @classmethod
+    def get_vk_execute_max_calls(cls):
+        """
+        Возвращает значение переменной класса __VK_EXECUTE_MAX_CALLS
+        """
+        return cls.__VK_EXECUTE_MAX_CALLS
+
+    @classmethod
+    def get_vk_execute_max_response(cls):
+        """
+        Возвращает значение переменной класса __VK_EXECUTE_MAX_RESPONSE
+        """
+        return cls.__VK_EXECUTE_MAX_RESPONSE
+
+    @classmethod
+    def get_vk_post_size_estimate(cls):
+        """
+        Возвращает значение переменной класса __VK_POST_SIZE_ESTIMATE
+        """
+        return cls.__VK_POST_SIZE_ESTIMATE
+
+    @classmethod
+    def get_vk_retry_attempts(cls):
+        """
+        Возвращает значение переменной класса __VK_RETRY_ATTEMPTS
+        """
+        return cls.__VK_RETRY_ATTEMPTS
+
+    @classmethod
+    def get_vk_retry_base_delay(cls):
+        """
+        Возвращает значение переменной класса __VK_RETRY_BASE_DELAY
+        """
+        return cls.__VK_RETRY_BASE_DELAY
+
+    @classmethod
+    def get_vk_retry_max_delay(cls):
+        """
+        Возвращает значение переменной класса __VK_RETRY_MAX_DELAY
+        """
+        return cls.__VK_RETRY_MAX_DELAY
+
+    @classmethod
+    def get_vk_breaker_threshold(cls):
+        """
+        Возвращает значение переменной класса __VK_BREAKER_THRESHOLD
+        """
+        return cls.__VK_BREAKER_THRESHOLD
+
+    @classmethod
+    def get_vk_breaker_timeout(cls):
+        """
+        Возвращает значение переменной класса __VK_BREAKER_TIMEOUT
+        """
+        return cls.__VK_BREAKER_TIMEOUT
+
+    @classmethod
+    def get_owner_cache_db(cls):
+        """
+        Возвращает значение переменной класса __OWNER_CACHE_DB
+        """
+        return cls.__OWNER_CACHE_DB
+
+    @classmethod
+    def get_text_context_window(cls):
+        """
+        Возвращает значение переменной класса __TEXT_CONTEXT_WINDOW
+        """
+        return cls.__TEXT_CONTEXT_WINDOW
+
+    @classmethod
+    def get_text_max_fragments(cls):
+        """
+        Возвращает значение переменной класса __TEXT_MAX_FRAGMENTS
+        """
+        return cls.__TEXT_MAX_FRAGMENTS
+
+    @classmethod
+    def get_text_match_stem(cls):
+        """
+        Возвращает значение переменной класса __TEXT_MATCH_STEM
+        """
+        return cls.__TEXT_MATCH_STEM
+
+    @classmethod
+    def get_full_text_store(cls):
+        """
+        Возвращает значение переменной класса __FULL_TEXT_STORE
+        """
+        return cls.__FULL_TEXT_STORE
+
+    @classmethod
+    def get_full_text_language(cls):
+        """
+        Возвращает значение переменной класса __FULL_TEXT_LANGUAGE
+        """
+        return cls.__FULL_TEXT_LANGUAGE
+
+    @classmethod
+    def get_full_text_compression(cls):
+        """
+        Возвращает значение переменной класса __FULL_TEXT_COMPRESSION
+        """
+        return cls.__FULL_TEXT_COMPRESSION
+
+    @classmethod
+    def get_posts_partition_ahead(cls):
+        """
+        Возвращает значение переменной класса __POSTS_PARTITION_AHEAD
+        """
+        return cls.__POSTS_PARTITION_AHEAD
+
+    @classmethod
+    def get_max_jobs(cls):
+        """
+        Возвращает значение переменной класса __MAX_JOBS
+        """
+        return cls.__MAX_JOBS
+
+    @classmethod
+    def get_crawl_workers(cls):
+        """
+        Возвращает значение переменной класса __CRAWL_WORKERS
+        """
+        return cls.__CRAWL_WORKERS
+
+    @classmethod
+    def get_crawl_mode(cls):
+        """
+        Возвращает значение переменной класса __CRAWL_MODE
+        """
+        return cls.__CRAWL_MODE
+
+    @classmethod
+    def get_checkpoint_interval(cls):
+        """
+        Возвращает значение переменной класса __CHECKPOINT_INTERVAL
+        """
+        return cls.__CHECKPOINT_INTERVAL
+
+    @classmethod
+    def get_page_queue_size(cls):
+        """
+        Возвращает значение переменной класса __PAGE_QUEUE_SIZE
+        """
+        return cls.__PAGE_QUEUE_SIZE
+
+    @classmethod
+    def get_db_batch_size(cls):
+        """
+        Возвращает значение переменной класса __DB_BATCH_SIZE
+        """
+        return cls.__DB_BATCH_SIZE
+
+    @classmethod
+    def get_db_writer_queue_size(cls):
+        """
+        Возвращает значение переменной класса __DB_WRITER_QUEUE_SIZE
+        """
+        return cls.__DB_WRITER_QUEUE_SIZE
+
+    @classmethod
+    def get_db_write_mode(cls):
+        """
+        Возвращает значение переменной класса __DB_WRITE_MODE
+        """
+        return cls.__DB_WRITE_MODE
+
+    @classmethod
+    def get_db_pool_size(cls):
+        """
+        Возвращает значение переменной класса __DB_POOL_SIZE
+        """
+        return cls.__DB_POOL_SIZE
+
+    @classmethod
+    def get_db_max_overflow(cls):
+        """
+        Возвращает значение переменной класса __DB_MAX_OVERFLOW
+        """
+        return cls.__DB_MAX_OVERFLOW
+
+    @classmethod
+    def get_db_pool_timeout(cls):
+        """
+        Возвращает значение переменной класса __DB_POOL_TIMEOUT
+        """
+        return cls.__DB_POOL_TIMEOUT
+
+    @classmethod
+    def get_db_pool_recycle(cls):
+        """
+        Возвращает значение переменной класса __DB_POOL_RECYCLE
+        """
+        return cls.__DB_POOL_RECYCLE
+
+    @classmethod
+    def get_db_pool_pre_ping(cls):
+        """
+        Возвращает значение переменной класса __DB_POOL_PRE_PING
+        """
+        return cls.__DB_POOL_PRE_PING
+
+    @classmethod
+    def get_db_statement_timeout(cls):
+        """
+        Возвращает значение переменной класса __DB_STATEMENT_TIMEOUT
+        """
+        return cls.__DB_STATEMENT_TIMEOUT
+
+    @classmethod
+    def get_db_prepare_threshold(cls):
+        """
+        Возвращает значение переменной класса __DB_PREPARE_THRESHOLD
         """
-        return cls.__VK_ACCESS_TOKEN
+        return cls.__DB_PREPARE_THRESHOLD
 
 
 print(f'Base provider name: <{AppConfig.get_base_provider_name()}>')
@@ -0,0 +1,131 @@
+import heapq
+import sys
+from array import array
+from bisect import bisect_left
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterable
+
+
+class DedupIndex:
+    """
+    Индекс уже сохраненных объектов с ключом (owner_id, id).
+    Ключ упаковывается в один int64, основная часть хранится в отсортированном массиве,
+    новые ключи накапливаются в множестве и периодически сливаются в массив.
+    """
+
+    # Количество ключей в буфере, после которого он сливается в массив
+    merge_threshold = 100_000
+
+    def __init__(self, keys: Iterable[int] = ()):
+        self._base = array('q', keys)
+        if any(self._base[i] > self._base[i + 1] for i in range(len(self._base) - 1)):
+            self._base = array('q', sorted(self._base))
+        self._delta = set()
+
+    @staticmethod
+    def pack(owner_id: int, _id: int) -> int:
+        """
+        Упаковывает пару (owner_id, id) в один int64
+        """
+        return (owner_id << 32) | (_id & 0xFFFFFFFF)
+
+    def __len__(self) -> int:
+        return len(self._base) + len(self._delta)
+
+    def __contains__(self, key: int) -> bool:
+        if key in self._delta:
+            return True
+        index = bisect_left(self._base, key)
+        return index < len(self._base) and self._base[index] == key
+
+    def add(self, owner_id: int, _id: int) -> bool:
+        """
+        Добавляет пару (owner_id, id) в индекс.
+        Возвращает False, если пара уже была в индексе
+        """
+        key = self.pack(owner_id, _id)
+        if key in self:
+            return False
+        self._delta.add(key)
+        if len(self._delta) >= self.merge_threshold:
+            self._merge()
+        return True
+
+    def add_many(self, pairs: list[tuple[int, int]]) -> list[bool]:
+        """
+        Добавляет пары (owner_id, id) и возвращает результат add для каждой.
+        Через прокси общего индекса заменяет обмен на каждый ключ одним обменом
+        """
+        return [self.add(owner_id, _id) for owner_id, _id in pairs]
+
+    def _merge(self) -> None:
+        """
+        Сливает буфер новых ключей в отсортированный массив за один линейный проход,
+        без промежуточного списка всех ключей
+        """
+        merged = array('q')
+        merged.extend(heapq.merge(self._base, sorted(self._delta)))
+        self._base = merged
+        self._delta = set()
+
+    def memory_usage(self) -> dict:
+        """
+        Возвращает оценку занимаемой памяти в байтах
+        """
+        base_bytes = sys.getsizeof(self._base)
+        delta_bytes = sys.getsizeof(self._delta) + sum(sys.getsizeof(key) for key in self._delta)
+        return {
+            'entries': len(self),
+            'base_bytes': base_bytes,
+            'delta_bytes': delta_bytes,
+            'total_bytes': base_bytes + delta_bytes
+        }
+
+    def report(self, name: str) -> str:
+        """
+        Возвращает строку с отчетом о занимаемой памяти
+        """
+        usage = self.memory_usage()
+        return (f"Dedup index {name}: {usage['entries']} keys, "
+                f"{usage['total_bytes'] / 1024 / 1024:.2f} MB "
+                f"(array {usage['base_bytes']} B, buffer {usage['delta_bytes']} B)")
+
+
+class GroupedDedupIndex:
+    """
+    Индекс ключей (group, owner_id, id) - по одному DedupIndex на значение group.
+    Три числа не упаковываются в int64, а различных group немного, например запросов в связях постов с запросами
+    """
+
+    def __init__(self, keys: Iterable[tuple[int, int]] = ()):
+        self._indexes = {
+            group: DedupIndex(key for _, key in items) for group, items in groupby(keys, key=itemgetter(0))
+        }
+
+    def __len__(self) -> int:
+        return sum(len(index) for index in self._indexes.values())
+
+    def __contains__(self, key: tuple[int, int]) -> bool:
+        group, packed = key
+        index = self._indexes.get(group)
+        return index is not None and packed in index
+
+    def add(self, group: int, owner_id: int, _id: int) -> bool:
+        """
+        Добавляет ключ в индекс группы. Возвращает False, если ключ уже был в индексе
+        """
+        index = self._indexes.get(group)
+        if index is None:
+            index = self._indexes[group] = DedupIndex()
+        return index.add(owner_id, _id)
+
+    def add_many(self, keys: list[tuple[int, int, int]]) -> list[bool]:
+        return [self.add(group, owner_id, _id) for group, owner_id, _id in keys]
+
+    def memory_usage(self) -> dict:
+        usages = [index.memory_usage() for index in self._indexes.values()]
+        return {name: sum(usage[name] for usage in usages)
+                for name in ('entries', 'base_bytes', 'delta_bytes', 'total_bytes')}
+
+    report = DedupIndex.report
@@ -0,0 +1,102 @@
+import os
+from threading import Lock
+from time import perf_counter
+from weakref import WeakSet
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+from config import AppConfig
+
+
+class TimedQueuePool(QueuePool):
+    """
+    Пул соединений, который сообщает время получения соединения.
+    Время включает ожидание свободного соединения и открытие нового, если пул еще не заполнен.
+    Наблюдатели - объекты с методом observe_pool_wait, например CrawlMetrics
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.observers = WeakSet()
+
+    def connect(self):
+        start = perf_counter()
+        timed_out = False
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            seconds = perf_counter() - start
+            for observer in list(self.observers):
+                observer.observe_pool_wait(seconds, timed_out)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.observers = self.observers
+        return pool
+
+
+def engine_options(url: str) -> dict:
+    """
+    Возвращает параметры create_engine из AppConfig.
+    SQLite использует пул SQLAlchemy по умолчанию, параметры сервера применяются только к PostgreSQL
+    """
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        return {}
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': AppConfig.get_db_pool_size(),
+        'max_overflow': AppConfig.get_db_max_overflow(),
+        'pool_timeout': AppConfig.get_db_pool_timeout(),
+        'pool_recycle': AppConfig.get_db_pool_recycle(),
+        'pool_pre_ping': AppConfig.get_db_pool_pre_ping()
+    }
+    connect_args = {}
+    if url.get_backend_name() == 'postgresql':
+        if AppConfig.get_db_statement_timeout() > 0:
+            connect_args['options'] = f'-c statement_timeout={AppConfig.get_db_statement_timeout()}'
+        if url.get_driver_name() == 'psycopg':
+            threshold = AppConfig.get_db_prepare_threshold()
+            connect_args['prepare_threshold'] = threshold if threshold >= 0 else None
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+_engines = {}
+_engines_pid = None
+_engines_lock = Lock()
+
+
+def get_engine(url: str = None) -> Engine:
+    """
+    Возвращает общее для процесса подключение к базе данных по строке подключения, по умолчанию - из AppConfig.
+    После fork подключения родителя не используются: их соединения принадлежат родительскому процессу
+    """
+    global _engines_pid
+    url = url or AppConfig.get_connection_string()
+    with _engines_lock:
+        if _engines_pid != os.getpid():
+            for engine in _engines.values():
+                engine.dispose(close=False)
+            _engines.clear()
+            _engines_pid = os.getpid()
+        engine = _engines.get(url)
+        if engine is None:
+            engine = create_engine(url, echo=False, **engine_options(url))
+            _engines[url] = engine
+        return engine
+
+
+def observe_pool(engine: Engine, observer) -> None:
+    """
+    Подписывает наблюдателя на время получения соединений из пула подключения
+    """
+    observers = getattr(engine.pool, 'observers', None)
+    if observers is not None:
+        observers.add(observer)
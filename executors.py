@@ -1,60 +1,164 @@
+import asyncio
+import calendar
+import json
+import time
 from datetime import datetime
-from queue import Queue
+from time import perf_counter
+from typing import Iterator
+from threading import Event, RLock
 
 from vk_api.exceptions import ApiError, ApiHttpError
 import vk_api
-from sqlalchemy import create_engine, select
+from sqlalchemy import select, insert, delete, func, inspect, literal_column, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker
 
 from config import AppConfig
-from models import Query, Owner, Post, Link, Photo, Video
+from models import Query, Owner, Post, Link, Photo, Video, CrawlMark, PostQuery, CrawlCheckpoint, PostText
 from logger import ParserLogger
+from dedup import DedupIndex, GroupedDedupIndex
+from engines import get_engine, observe_pool
+from vk_client import AsyncVkClient, ApiStats
+from limiter import TokenPool
+from retry import RetryController, RETRY, SPLIT, classify_error
+from jobs import JobProgress
+from planner import BatchPlanner
+from channel import PageChannel, WallItem, LinkItem, PhotoItem, VideoItem, parse_wall_item
+from metrics import CrawlMetrics
+from registry import OwnerRegistry
+from matcher import TextMatcher
+from partitions import ensure_post_partitions, is_partitioned
+from records import OwnerRecord, PostRecord, LinkRecord, PhotoRecord, VideoRecord, PostQueryRecord, to_model, \
+    to_text_model
 
 
 class SearchOwner:
     """
 
     """
+    __slots__ = ('id', 'domain', 'type', 'first_name', 'last_name', 'is_closed', 'is_active', 'cursors')
+
     def __init__(self, _id: int, domain: str, _type: str, first_name: str, is_closed: bool, last_name=None):
         self.id = _id
         self.domain = domain
-        self.type = _type,
-        self.first_name = first_name,
+        self.type = _type
+        self.first_name = first_name
         self.last_name = last_name
         self.is_closed = is_closed
         self.is_active = not is_closed
+        self.cursors = []
 
     def __repr__(self):
         return f'Owner: {self.id}_{self.domain}'
 
 
+# Причины завершения обхода стены по запросу. Курсоры, завершенные ошибкой запроса, продолжаются
+# при возобновлении обхода, ошибка владельца (закрытая или удаленная стена) завершает обход окончательно
+FINISH_END = 'end'
+FINISH_MARK = 'mark'
+FINISH_DATE = 'date'
+FINISH_ERROR = 'error'
+FINISH_CLOSED = 'closed'
+
+
+class WallCursor:
+    """
+    Состояние обхода стены владельца по одному запросу.
+    offset - смещение следующей запрашиваемой страницы, done_offset - смещение после последней разобранной,
+    finish - причина завершения обхода
+    """
+    __slots__ = ('owner', 'query', 'query_id', 'is_active', 'total_cnt', 'offset', 'done_offset', 'last_date',
+                 'newest', 'finish')
+
+    def __init__(self, owner: SearchOwner, query: str, query_id: int):
+        self.owner = owner
+        self.query = query
+        self.query_id = query_id
+        self.is_active = owner.is_active
+        self.total_cnt = None
+        self.offset = 0
+        self.done_offset = 0
+        self.last_date = None
+        self.newest = None
+        self.finish = None
+
+    def __repr__(self):
+        return f'{self.owner} Query: {self.query}'
+
+
 class ApiParser:
     """
 
     """
 
-    def __init__(self, version: str, token: str, query: str, queue: Queue):
+    # Максимальное количество id в одном вызове users.get и groups.getById
+    users_get_limit = 1000
+    groups_get_limit = 500
+
+    def __init__(self, version: str, tokens: list[str], queries: list[str], queue: PageChannel,
+                 progress: JobProgress = None, cancel_event=None, shard: tuple[int, int] = (0, 1),
+                 indexes: dict = None):
         self.logger = ParserLogger()
+        self.progress = progress if progress is not None else JobProgress()
+        self.metrics = self.progress.metrics
+        self.cancel_event = cancel_event if cancel_event is not None else Event()
         self.domain = 'https://vk.com/'
         self.api_url = 'https://api.vk.com/method/wall.search'
         self.headers = self.get_headers()
         self.queue = queue
+        self.state_lock = RLock()
         self.version = version
-        self.token = token
-        self.api = vk_api.VkApi(token=token, api_version=version)
+        self.tokens = tokens
+        self.token_pool = TokenPool(tokens, AppConfig.get_vk_rate_limit(), AppConfig.get_vk_rate_burst(), self.logger)
+        self.apis = {token: vk_api.VkApi(token=token, api_version=version) for token in tokens}
+        self.transport = AppConfig.get_vk_transport()
+        self.client = AsyncVkClient(self.token_pool, version, AppConfig.get_vk_concurrency(), self.metrics)
+        self.api_stats = self.client.stats if self.transport == 'async' else ApiStats(self.metrics)
+        self.planner = BatchPlanner(
+            AppConfig.get_vk_execute_max_calls(),
+            AppConfig.get_vk_execute_max_response(),
+            AppConfig.get_vk_post_size_estimate()
+        )
+        self.retry = RetryController(
+            AppConfig.get_vk_retry_attempts(),
+            AppConfig.get_vk_retry_base_delay(),
+            AppConfig.get_vk_retry_max_delay(),
+            AppConfig.get_vk_breaker_threshold(),
+            AppConfig.get_vk_breaker_timeout(),
+            self.metrics
+        )
+        self.loop = asyncio.new_event_loop()
         self.loader = DataExecutor()
-        self.query = query
-        self.query_id = self.loader.get_query_id(self.query)
-        self.search_owners = []
-        self.post_ids = self.loader.select_ids(Post)
-        self.photo_ids = self.loader.select_ids(Photo)
-        self.video_ids = self.loader.select_ids(Video)
-        self.active_owners = 0
+        self.queries = queries
+        self.matcher = TextMatcher(
+            queries, AppConfig.get_text_context_window(), AppConfig.get_text_max_fragments(),
+            AppConfig.get_text_match_stem()
+        )
+        self.query_ids = {query: self.loader.get_query_id(query) for query in queries}
+        self.incremental = AppConfig.get_crawl_mode() == 'incremental'
+        self.marks = self.loader.get_crawl_marks(list(self.query_ids.values())) if self.incremental else {}
+        self.search_owners = OwnerRegistry()
+        self.stored_loaded = False
+        self.shard = shard
+        self.follow_reposts = True
+        self.include_stored = True
+        if indexes is None:
+            indexes = {name: self.loader.load_dedup_index(name) for name in DataExecutor.dedup_models}
+        self.post_index = indexes['posts']
+        self.photo_index = indexes['photos']
+        self.video_index = indexes['videos']
+        self.post_query_index = indexes['post_queries']
+        self.indexes = indexes
+        # Результаты add_many для ключей текущей страницы по индексам
+        self.claims = {name: {} for name in indexes}
+        for name, index in indexes.items():
+            self.logger.info(index.report(name))
+        self.update_dedup_metrics()
         self.posts = []
+        self.post_queries = []
         self.ext_user_ids = []
         self.ext_group_ids = []
         self.owners = []
-        self.owner_ids = []
         # self.posts_count = 0
 
     @staticmethod
@@ -76,14 +180,15 @@ class ApiParser:
         source = [str(el) for el in source]
         return ', '.join(source)
 
+    @property
+    def active_owners(self) -> int:
+        return self.search_owners.active_cnt
+
     def check_owner_exists(self, owner_id) -> bool:
         """
 
         """
-        for owner in self.search_owners:
-            if owner_id == owner.id:
-                return True
-        return False
+        return owner_id in self.search_owners
 
     def get_error_message(self, owner: dict, owner_type: str, exists: bool) -> None:
         """
@@ -97,33 +202,148 @@ class ApiParser:
         message = message + f' deactivated: {deactivated}' if deactivated is not None else message
         self.logger.info(message)
 
-    def get_vk_owners(self, user_ids: list, group_ids: list) -> dict:
+    def execute(self, codes: list[str], script: str = 'execute') -> list:
         """
-
+        Выполняет скрипты execute и возвращает список пар: ответ и ошибки вызовов из execute_errors.
+        Вызов с ошибкой возвращает в ответе false, ошибки идут в порядке таких вызовов.
+        Ошибка выполнения скрипта возвращается на месте его пары
         """
-        code = ('return [API.users.get({"user_ids": ' +
-                str(user_ids) +
-                ', "fields": "domain"}), API.groups.getById({"group_ids": ' +
-                str(group_ids) +
-                '})];')
-        owners_json = self.api.method(method='execute', values={'code': code})
-        return owners_json
+        if self.transport == 'async':
+            raw_results = self.loop.run_until_complete(self.client.execute_many(codes, script))
+            return [raw if isinstance(raw, Exception) else (raw['response'], raw.get('execute_errors', []))
+                    for raw in raw_results]
+        results = []
+        for code in codes:
+            token = self.token_pool.acquire()
+            start = perf_counter()
+            try:
+                raw = self.apis[token].method(method='execute', values={'code': code}, raw=True)
+                results.append((raw['response'], raw.get('execute_errors', [])))
+                self.api_stats.add(perf_counter() - start, False, script)
+                self.token_pool.release(token)
+            except ApiError as e:
+                self.api_stats.add(perf_counter() - start, True, script)
+                self.token_pool.release(token, e.code)
+                results.append(e)
+            except ApiHttpError as e:
+                self.api_stats.add(perf_counter() - start, True, script)
+                self.token_pool.release(token)
+                results.append(e)
+        return results
 
-    def add_search_owners(self, user_ids=None, group_ids=None) -> None:
+    def get_vk_owners(self, user_ids: list, group_ids: list) -> tuple[list, list]:
         """
+        Запрашивает пользователей и группы одним скриптом execute.
+        Количество id не должно превышать users_get_limit и groups_get_limit
+        """
+        calls = []
+        if user_ids:
+            calls.append('API.users.get({"user_ids": ' + json.dumps(user_ids) + ', "fields": "domain"})')
+        if group_ids:
+            calls.append('API.groups.getById({"group_ids": ' + json.dumps(group_ids) + '})')
+        if not calls:
+            return [], []
+        code = 'return [' + ', '.join(calls) + '];'
+        attempt = 1
+        error = None
+        while True:
+            self.wait_breakers()
+            owners_json = self.execute([code], 'users.get,groups.getById')[0]
+            if not isinstance(owners_json, Exception):
+                self.retry.on_success(error)
+                owners_json, execute_errors = owners_json
+                for error in execute_errors:
+                    self.logger.error("Owners request error %s: %s", error['error_code'], error['error_msg'])
+                users_json = (owners_json.pop(0) or []) if user_ids else []
+                groups_json = (owners_json.pop(0) or {}).get('groups', []) if group_ids else []
+                return users_json, groups_json
+            action, delay = self.retry.decide(owners_json, attempt)
+            if action != RETRY:
+                raise owners_json
+            self.logger.error(f"Owners request error: {owners_json}. Try: {attempt}, wait {delay:.1f} s")
+            time.sleep(delay)
+            attempt += 1
+            error = owners_json
 
+    @staticmethod
+    def owner_keys(owner_type: str, owner: dict) -> list[str]:
         """
-        owners_exists = self.loader.get_owners()
-        if user_ids is None and group_ids is None:
-            self.search_owners = owners_exists
+        Возвращает ключи, по которым владелец может быть запрошен
+        """
+        if owner_type == 'user':
+            names = (str(owner['id']), f"id{owner['id']}", owner.get('domain'))
         else:
-            vk_owners_json = self.get_vk_owners(user_ids, group_ids)
-            self.search_owners = list(set(self.create_users(vk_owners_json[0]) +
-                                          self.create_groups(vk_owners_json[1]['groups']) +
-                                          owners_exists))
-        for owner in self.search_owners:
-            if owner.is_active:
-                self.active_owners += 1
+            names = (str(owner['id']), f"club{owner['id']}", f"public{owner['id']}", owner.get('screen_name'))
+        return [name.lower() for name in names if name]
+
+    @classmethod
+    def match_owners(cls, owner_type: str, owners: list[dict], keys: list) -> tuple[list[dict], list]:
+        """
+        Возвращает владельцев, запрошенных по ключам keys, без повторов и ключи, для которых владелец не найден
+        """
+        owners_by_key = {key: owner for owner in owners for key in cls.owner_keys(owner_type, owner)}
+        found = {}
+        misses = []
+        for key in keys:
+            owner = owners_by_key.get(str(key).lower())
+            if owner is None:
+                misses.append(key)
+            else:
+                found[owner['id']] = owner
+        return list(found.values()), misses
+
+    def resolve_owners(self, user_ids: list, group_ids: list) -> tuple[list, list]:
+        """
+        Возвращает ответы users.get и groups.getById по id и коротким именам.
+        Кэшем владельцев служит таблица tOwners: владельцы ищутся в ней, в vk api запрашиваются только оставшиеся.
+        Кэш в памяти не ведется: обход выполняется в отдельном процессе и кэш терялся бы вместе с ним
+        """
+        users_json, user_misses = [], list(user_ids)
+        groups_json, group_misses = [], list(group_ids)
+        if AppConfig.get_owner_cache_db() and (user_misses or group_misses):
+            stored_users, stored_groups = self.loader.find_owners(user_misses, group_misses)
+            users_json, user_misses = self.match_owners('user', stored_users, user_misses)
+            groups_json, group_misses = self.match_owners('group', stored_groups, group_misses)
+        requested_cnt = len(user_misses) + len(group_misses)
+        while user_misses or group_misses:
+            user_chunk, user_misses = user_misses[:self.users_get_limit], user_misses[self.users_get_limit:]
+            group_chunk, group_misses = group_misses[:self.groups_get_limit], group_misses[self.groups_get_limit:]
+            vk_users, vk_groups = self.get_vk_owners(user_chunk, group_chunk)
+            users_json += vk_users
+            groups_json += vk_groups
+        self.logger.info(f'Owners: {len(user_ids) + len(group_ids)} keys, {requested_cnt} requested from vk api')
+        return users_json, groups_json
+
+    def add_search_owners(self, user_ids=None, group_ids=None) -> None:
+        """
+        Добавляет владельцев в обход. Сохраненные владельцы загружаются из базы один раз за обход,
+        уже известные реестру владельцы повторно не запрашиваются и не обходятся.
+        Владельцы других шардов пропускаются по id, в том числе запрошенные по короткому имени
+        """
+        new_owners = []
+        if self.include_stored and not self.stored_loaded:
+            new_owners += [owner for owner in self.loader.get_owners() if self.in_shard(owner.id)]
+            self.stored_loaded = True
+        stored_cnt = len(new_owners)
+        user_ids = [key for key in user_ids or [] if not self.search_owners.has_key(key)]
+        group_ids = [key for key in group_ids or [] if not self.search_owners.has_key(key, is_group=True)]
+        if user_ids or group_ids:
+            users_json, groups_json = self.resolve_owners(user_ids, group_ids)
+            new_owners += [owner for owner in self.create_users(users_json) + self.create_groups(groups_json)
+                           if self.in_shard(owner.id)]
+        with self.state_lock:
+            active_before = self.active_owners
+            for index, owner in enumerate(new_owners):
+                owner.cursors = [WallCursor(owner, query, query_id) for query, query_id in self.query_ids.items()]
+                self.search_owners.add(owner, exported=index < stored_cnt)
+            self.progress.add('active_owners', self.active_owners - active_before)
+
+    def in_shard(self, owner_id: int) -> bool:
+        """
+        Проверяет, что владелец относится к шарду этого парсера
+        """
+        shard_index, shard_count = self.shard
+        return abs(owner_id) % shard_count == shard_index
 
     def create_users(self, users_json: dict) -> list[SearchOwner]:
         """
@@ -172,102 +392,272 @@ class ApiParser:
 
     def create_owners(self) -> None:
         """
-
+        Создает записи владельцев, добавленных в реестр после предыдущего вызова
         """
-        exists_owner_ids = self.loader.get_owner_ids()
-        for owner in self.search_owners:
-            if owner.id not in exists_owner_ids and owner.id not in self.owner_ids:
-                self.owners.append(
-                    Owner(
-                        id=owner.id,
-                        domain=owner.domain,
-                        type=owner.type,
-                        url=self.domain + owner.domain,
-                        name=owner.first_name if owner.last_name is None else None,
-                        first_name=owner.first_name if owner.last_name is not None else None,
-                        last_name=owner.last_name,
-                        is_closed=owner.is_closed
-                    )
-                )
-                self.owner_ids.append(owner.id)
+        with self.state_lock:
+            new_owners = self.search_owners.pop_unexported()
+        if not new_owners:
+            return
+        records = self.create_owner_records(new_owners)
+        # Записи забирает поток менеджера
+        with self.state_lock:
+            self.owners += records
+
+    def create_owner_records(self, owners: list[SearchOwner]) -> list[OwnerRecord]:
+        """
+        Возвращает записи владельцев, которых еще нет в tOwners
+        """
+        exists_owner_ids = set(self.loader.get_owner_ids())
+        return [
+            OwnerRecord(
+                id=owner.id,
+                domain=owner.domain,
+                type=owner.type,
+                url=self.domain + owner.domain,
+                name=owner.first_name if owner.last_name is None else None,
+                first_name=owner.first_name if owner.last_name is not None else None,
+                last_name=owner.last_name,
+                is_closed=owner.is_closed
+            )
+            for owner in owners if owner.id not in exists_owner_ids
+        ]
 
-    def ran_search_owner_wall(self, count=None, offset=None) -> None:
+    def create_ext_owners(self) -> None:
+        """
+        Создает записи владельцев из репостов без обхода их стен.
+        Нужен, когда следующий круг обходит не этот парсер: иначе посты из репостов остаются без владельца
+        """
+        with self.state_lock:
+            user_ids = [key for key in set(self.ext_user_ids) if not self.search_owners.has_key(key)]
+            group_ids = [key for key in set(self.ext_group_ids)
+                         if not self.search_owners.has_key(key, is_group=True)]
+        if not user_ids and not group_ids:
+            return
+        users_json, groups_json = self.resolve_owners(user_ids, group_ids)
+        records = self.create_owner_records(self.create_users(users_json) + self.create_groups(groups_json))
+        with self.state_lock:
+            self.owners += records
+
+    def ran_search_owner_wall(self, count=None) -> None:
         """
 
         """
-        attempts = 1
-        stack = [self.search_owners]
-        while stack:
+        stack = [[cursor for owner in self.search_owners.active() for cursor in owner.cursors]]
+        while stack and not self.cancel_event.is_set():
             current_list = stack.pop()
-            try:
-                if self.active_owners > 0:
-                    self.search_owner_wall(current_list, count, offset)
-                else:
-                    self.queue.put(None)
-                    break
-            except ApiError as e:
-                attempts += 1
-                self.logger.error(f"Api error: {e}. Try: {attempts}")
-                mid_index = len(current_list) // 2
-                stack.append(current_list[:mid_index])
-                stack.append(current_list[mid_index:])
-
-    def search_owner_wall(self, search_owners: list[SearchOwner], count, offset) -> None:
-        """
-
-        """
-        owner_walls = {}
-        code_list = []
-        for owner in search_owners:
-            if owner.is_active:
-                code_list.append(
-                    ('API.wall.search({"domain": "' + owner.domain +
-                     '", "query": "' + self.query +
-                     '", "count": ' + str(count) +
-                     ', "offset": ' + str(offset) +
-                     '})')
-                )
-                owner_walls[owner] = None
-        code = 'return ' + str(code_list).replace("'", "") + ';'
-        attempts = 1
-        while True:
-            try:
-                walls_json = self.api.method(method='execute', values={'code': code})
-                owner_walls.update(dict(zip(owner_walls.keys(), walls_json)))
-                self.put_owner_posts(owner_walls)
+            if self.active_owners > 0:
+                for failed_list, e in self.search_owner_wall(current_list, count):
+                    self.logger.error(f"Api error: {e}. Split {len(failed_list)} calls")
+                    if len(failed_list) > 1:
+                        mid_index = len(failed_list) // 2
+                        stack.append(failed_list[:mid_index])
+                        stack.append(failed_list[mid_index:])
+                    else:
+                        finish = FINISH_CLOSED if classify_error(e) == 'owner' else FINISH_ERROR
+                        self.deactivate_cursor(failed_list[0], f'api error {e}', finish)
+            else:
                 break
-            except ApiHttpError as e:
-                attempts += 1
-                self.logger.error(f"ApiHttpError: {e}. Try: {attempts}")
 
-    def put_owner_posts(self, owner_walls: dict) -> None:
+    @staticmethod
+    def get_wall_search_code(cursor: WallCursor, count) -> str:
         """
 
         """
-        for owner, wall in owner_walls.items():
-            self.logger.info(f'Search - {owner}')
-            if isinstance(wall, dict):
-                if 'error' in wall.keys():
-                    error = wall['error']
-                    self.logger.error(f"Error {error['error_code']}: {error['error_msg']}")
-                    owner.is_active = False
-                    self.active_owners -= 1
+        return ('API.wall.search({"domain": ' + json.dumps(cursor.owner.domain) +
+                ', "query": ' + json.dumps(cursor.query, ensure_ascii=False) +
+                ', "count": ' + str(count) +
+                ', "offset": ' + str(cursor.offset) +
+                '})')
+
+    def wait_breakers(self) -> None:
+        """
+        Приостанавливает отправку запросов, пока разомкнут прерыватель какого-либо класса ошибок
+        """
+        delay = self.retry.wait_time()
+        if delay:
+            self.logger.warning(f"Circuit breaker is open, wait {delay:.1f} s")
+            self.retry.stats.retry_time += delay
+            time.sleep(delay)
+
+    def search_owner_wall(self, cursors: list[WallCursor], count) -> list[tuple]:
+        """
+        Параллельно выполняет пачки execute, составленные планировщиком.
+        Вызовы разных запросов по одному владельцу попадают в общие пачки,
+        каждая пара владелец-запрос запрашивается со своего смещения.
+        Возвращает пачки вызовов, которые нужно разбить, вместе с ошибкой
+        """
+        active_cursors = [cursor for cursor in cursors if cursor.is_active]
+        batches = []
+        for batch_cursors in self.planner.plan(active_cursors, count):
+            code_list = [self.get_wall_search_code(cursor, count) for cursor in batch_cursors]
+            self.metrics.execute_batch_size.observe(len(code_list))
+            batches.append((batch_cursors, 'return [' + ', '.join(code_list) + '];', 1, None))
+        failed = []
+        while batches:
+            self.wait_breakers()
+            results = self.execute([code for _, code, _, _ in batches], 'wall.search')
+            retry_batches = []
+            retry_delay = 0.0
+            for (batch_cursors, code, attempt, error), walls_json in zip(batches, results):
+                if not isinstance(walls_json, Exception):
+                    self.retry.on_success(error)
+                    walls_json, execute_errors = walls_json
+                    self.put_owner_posts(dict(zip(batch_cursors, walls_json)), count, execute_errors)
+                    continue
+                if not isinstance(walls_json, (ApiError, ApiHttpError)):
+                    raise walls_json
+                action, delay = self.retry.decide(walls_json, attempt)
+                if action == RETRY:
+                    self.logger.error(f"{type(walls_json).__name__}: {walls_json}. Try: {attempt}, wait {delay:.1f} s")
+                    retry_batches.append((batch_cursors, code, attempt + 1, walls_json))
+                    retry_delay = max(retry_delay, delay)
+                elif action == SPLIT:
+                    failed.append((batch_cursors, walls_json))
                 else:
-                    self.logger.info(f"Post count - {owner}: {wall['count']}")
-                    self.queue.put({'owner': owner, 'wall_json': wall})
+                    for cursor in batch_cursors:
+                        self.deactivate_cursor(cursor, f'request failed after {attempt} tries: {walls_json}')
+            if retry_delay:
+                time.sleep(retry_delay)
+            batches = retry_batches
+        return failed
+
+    def get_crawl_marks(self) -> dict[tuple[int, int], tuple[int, int]]:
+        """
+        Возвращает самые новые посты, полученные в этом обходе, по парам владелец-запрос.
+        Сохраняются только пары, обход которых дошел до конца стены или до прошлой отметки:
+        после ошибки или остановки по дате в истории остается пропуск
+        """
+        return {
+            (owner.id, cursor.query_id): cursor.newest
+            for owner in self.search_owners for cursor in owner.cursors
+            if cursor.newest is not None and not cursor.is_active and cursor.finish in (FINISH_END, FINISH_MARK)
+        }
 
-    def check_wall(self, owner: SearchOwner, wall: dict, count: int):
+    def has_failed_cursors(self) -> bool:
         """
+        Проверяет, что обход какой-либо стены прерван ошибкой запроса
+        """
+        with self.state_lock:
+            return any(cursor.finish == FINISH_ERROR for owner in self.search_owners for cursor in owner.cursors)
+
+    def get_checkpoint(self) -> dict:
+        """
+        Возвращает состояние обхода по разобранным страницам.
+        Курсор считается завершенным, только если разобраны все полученные им страницы,
+        курсор, завершенный ошибкой запроса, продолжается при возобновлении
+        """
+        with self.state_lock:
+            owners = [
+                [owner.id, owner.domain, owner.type, owner.first_name, owner.last_name, owner.is_closed,
+                 [[cursor.query_id, cursor.done_offset, cursor.total_cnt, cursor.last_date, cursor.newest,
+                   cursor.is_active or cursor.done_offset < cursor.offset or cursor.finish == FINISH_ERROR,
+                   cursor.finish]
+                  for cursor in owner.cursors]]
+                for owner in self.search_owners
+            ]
+            ext_user_ids = list(self.ext_user_ids)
+            ext_group_ids = list(self.ext_group_ids)
+        return {
+            'stored_loaded': self.stored_loaded,
+            'ext_user_ids': ext_user_ids,
+            'ext_group_ids': ext_group_ids,
+            'owners': owners
+        }
 
+    def restore(self, state: dict) -> None:
+        """
+        Восстанавливает владельцев и курсоры из контрольной точки, обход продолжается с разобранных страниц
+        """
+        queries = {query_id: query for query, query_id in self.query_ids.items()}
+        with self.state_lock:
+            active_before = self.active_owners
+            for _id, domain, _type, first_name, last_name, is_closed, cursors in state.get('owners', []):
+                owner = SearchOwner(_id=_id, domain=domain, _type=_type, first_name=first_name,
+                                    last_name=last_name, is_closed=is_closed)
+                for query_id, offset, total_cnt, last_date, newest, is_active, finish in cursors:
+                    if query_id not in queries:
+                        continue
+                    cursor = WallCursor(owner, queries[query_id], query_id)
+                    cursor.offset = cursor.done_offset = offset
+                    cursor.total_cnt = total_cnt
+                    cursor.last_date = last_date
+                    cursor.newest = tuple(newest) if newest is not None else None
+                    cursor.is_active = is_active and not is_closed
+                    cursor.finish = None if cursor.is_active else finish
+                    owner.cursors.append(cursor)
+                owner.is_active = any(cursor.is_active for cursor in owner.cursors)
+                self.search_owners.add(owner)
+            self.progress.add('active_owners', self.active_owners - active_before)
+        self.stored_loaded = state.get('stored_loaded', False)
+        self.ext_user_ids = state.get('ext_user_ids', [])
+        self.ext_group_ids = state.get('ext_group_ids', [])
+        self.logger.info(f'Restored checkpoint: {len(self.search_owners)} owners, {self.active_owners} active')
+
+    def deactivate_cursor(self, cursor: WallCursor, reason: str, finish: str = FINISH_ERROR) -> None:
+        """
+        Завершает обход стены по запросу, владелец деактивируется вместе с последним запросом
+        """
+        with self.state_lock:
+            if not cursor.is_active:
+                return
+            cursor.is_active = False
+            cursor.finish = finish
+            self.logger.debug("Deactivate - %s: %s", cursor, reason)
+            if not any(owner_cursor.is_active for owner_cursor in cursor.owner.cursors):
+                self.deactivate_owner(cursor.owner, 'all queries finished')
+
+    def deactivate_owner(self, owner: SearchOwner, reason: str, finish: str = FINISH_ERROR) -> None:
+        """
+        Завершает обход стены по всем запросам, finish - причина для еще активных курсоров
+        """
+        with self.state_lock:
+            for cursor in owner.cursors:
+                if cursor.is_active:
+                    cursor.finish = finish
+                cursor.is_active = False
+            if self.search_owners.deactivate(owner):
+                self.progress.add('active_owners', -1)
+                self.logger.debug("Deactivate - %s: %s", owner, reason)
+
+    def put_owner_posts(self, cursor_walls: dict, count: int, execute_errors: list = ()) -> None:
+        """
+        Передает страницы в очередь и сдвигает курсоры.
+        Курсор, у которого не осталось страниц, деактивируется.
+        Вызов, вернувший false, завершает курсор, а ошибка владельца - обход всей стены
         """
-        if wall['count'] == 0:
-            owner.is_active = False
-            self.active_owners -= 1
-            self.logger.info(f"Deactivate - {owner}: no posts")
-        elif wall['count'] < count:
-            owner.is_active = False
-            self.active_owners -= 1
-            self.logger.info(f"Deactivate - {owner}: post count < {count}")
+        errors = iter(execute_errors)
+        for cursor, wall in cursor_walls.items():
+            self.logger.debug('Search - %s', cursor)
+            if not isinstance(wall, dict):
+                error = next(errors, None)
+                self.fail_cursor(cursor, error)
+                continue
+            cursor.total_cnt = wall['count']
+            cursor.offset += count
+            self.progress.add('pages')
+            self.logger.debug("Post count - %s: %s", cursor, wall['count'])
+            self.queue.put_page(cursor, [parse_wall_item(item) for item in wall['items']], cursor.offset)
+            self.metrics.page_queue_depth.set(self.queue.qsize())
+            if wall['count'] == 0:
+                self.deactivate_cursor(cursor, 'no posts', FINISH_END)
+            elif cursor.offset >= wall['count']:
+                self.deactivate_cursor(cursor, f'all {wall["count"]} posts fetched', FINISH_END)
+
+    def fail_cursor(self, cursor: WallCursor, error: dict = None) -> None:
+        """
+        Деактивирует курсор по ошибке вызова из execute_errors.
+        Ошибки класса owner (закрытая или удаленная стена) деактивируют владельца
+        """
+        if error is None:
+            error = {'error_code': 0, 'error_msg': 'false response without execute_errors'}
+        error_class = classify_error(ApiError(None, error.get('method', 'wall.search'), None, error, error))
+        self.retry.stats.errors_cnt[error_class] += 1
+        self.metrics.observe_error(error_class)
+        self.logger.error("Error %s - %s: %s", error['error_code'], cursor, error['error_msg'])
+        if error_class == 'owner':
+            self.deactivate_owner(cursor.owner, f"error {error['error_code']}", FINISH_CLOSED)
+        else:
+            self.deactivate_cursor(cursor, f"error {error['error_code']}")
 
     def prepare_text(self, source: str) -> str:
         """
@@ -288,192 +678,339 @@ class ApiParser:
 
     def get_query_fragment(self, text: str) -> str:
         """
-
+        Возвращает фрагменты текста вокруг вхождений запросов или None
         """
-        query = self.query
-        start_index = text.find(query)
-        if start_index != -1:
-            start_slice = max(0, start_index - 15)
-            end_slice = min(len(text), start_index + len(query) + 15)
-            return text[start_slice:end_slice]
+        return self.matcher.fragment(text)
 
-    def create_owner_posts(self, owner: SearchOwner, post_list: list, stop_date) -> None:
+    def create_owner_posts(self, cursor: WallCursor, post_list: list[WallItem], stop_date) -> None:
         """
-
+        Создает посты страницы, репосты из них и вложения.
+        Ключи страницы отмечаются в индексах дедупликации пачками: сначала посты, затем репосты новых постов,
+        затем вложения новых постов и репостов
         """
         if post_list:
-            post_count = 0
+            mark = self.marks.get((cursor.owner.id, cursor.query_id))
+            accepted = []
             for post in post_list:
-                if stop_date is not None and post['date'] < stop_date:
-                    owner.is_active = False
-                    self.active_owners -= 1
-                    self.logger.info(
-                        f"Deactivate - {owner}: post out of date {str(datetime.utcfromtimestamp(post['date']))}"
+                if stop_date is not None and post.date < stop_date:
+                    self.deactivate_cursor(
+                        cursor, f"post out of date {str(datetime.utcfromtimestamp(post.date))}", FINISH_DATE
                     )
+                    # Курсор мог завершиться на последней странице раньше, но старые посты пропущены
+                    cursor.finish = FINISH_DATE
+                elif mark is not None and (post.date, post.id) <= mark:
+                    self.deactivate_cursor(cursor, f"reached stored post {post.id}", FINISH_MARK)
                 else:
-                    post_obj = self.create_post(post)
-                    if post_obj is not None:
-                        if 'attachments' in post.keys():
-                            self.set_post_attachments(post_obj, post['attachments'])
-                        if 'copy_history' in post.keys():
-                            self.post_history_process(post['copy_history'])
-                        self.posts.append(post_obj)
-                        post_count += 1
-            self.logger.info(f"Created posts - {owner}: {post_count}")
-
-    def create_post(self, post: dict) -> Post:
-        """
-
-        """
-        if post['id'] not in self.post_ids:
-            views_cnt = post['views']['count'] if 'views' in post.keys() else None
-            likes_cnt = post['likes']['count'] if 'likes' in post.keys() else None
-            comments_cnt = post['comments']['count'] if 'comments' in post.keys() else None
-            reposts_cnt = post['reposts']['count'] if 'reposts' in post.keys() else None
-            post_obj = Post(
-                id=post['id'],
-                query_id=self.query_id,
-                type=post.get('post_type', None),
-                date=datetime.utcfromtimestamp(post['date']),
-                from_id=post['from_id'],
-                views_cnt=views_cnt,
-                likes_cnt=likes_cnt,
-                comments_cnt=comments_cnt,
-                reposts_cnt=reposts_cnt,
-                text=self.prepare_text(post['text']),
-                owner_id=post['owner_id'],
-                url=f"{self.domain}wall{post['owner_id']}_{post['id']}"
+                    if cursor.newest is None or (post.date, post.id) > cursor.newest:
+                        cursor.newest = (post.date, post.id)
+                    if cursor.last_date is None or post.date < cursor.last_date:
+                        cursor.last_date = post.date
+                    accepted.append(post)
+            new_posts = self.create_posts(accepted, cursor.query_id)
+            history = self.create_posts(
+                [copy for post, _ in new_posts for copy in post.copy_history], cursor.query_id
             )
-            self.post_ids.append(post['id'])
-            return post_obj
+            self.claim_attachments([post for post, _ in new_posts + history])
+            for post, post_obj in new_posts:
+                self.set_post_attachments(post_obj, post.attachments)
+            self.post_history_process(history)
+            for _, post_obj in new_posts:
+                self.posts.append(post_obj)
+                self.progress.add('posts')
+            for claims in self.claims.values():
+                claims.clear()
+            self.logger.debug("Created posts - %s: %s", cursor, len(new_posts))
 
-    def set_post_attachments(self, post: object, attachments: list) -> None:
+    def claim(self, name: str, keys: list[tuple]) -> None:
+        """
+        Отмечает ключи в индексе одним вызовом add_many, результаты забирает is_new.
+        В шардах индекс живет в процессе сервиса дедупликации, и вызов на каждый ключ - это обмен с ним
+        """
+        claims = self.claims[name]
+        keys = [key for key in dict.fromkeys(keys) if key not in claims]
+        if keys:
+            claims.update(zip(keys, self.indexes[name].add_many(keys)))
+
+    def is_new(self, name: str, *key: int) -> bool:
+        """
+        Проверяет, что ключ добавлен в индекс впервые. Повторный ключ страницы считается уже добавленным
+        """
+        claims = self.claims[name]
+        claimed = claims.get(key)
+        if claimed is None:
+            return self.indexes[name].add(*key)
+        claims[key] = False
+        return claimed
+
+    def create_posts(self, posts: list[WallItem], query_id: int) -> list[tuple[WallItem, PostRecord]]:
+        """
+        Создает посты, которые еще не сохранены, и возвращает их вместе с ответами vk api
         """
+        self.claim('post_queries', [(query_id, post.owner_id, post.id) for post in posts])
+        self.claim('posts', [(post.owner_id, post.id) for post in posts])
+        new_posts = []
+        for post in posts:
+            post_obj = self.create_post(post, query_id)
+            if post_obj is not None:
+                new_posts.append((post, post_obj))
+        return new_posts
+
+    def claim_attachments(self, posts: list[WallItem]) -> None:
+        """
+        Отмечает фотографии и видео постов в индексах
+        """
+        attachments = [attachment for post in posts for attachment in post.attachments]
+        self.claim('photos', [(item.owner_id, item.id) for item in attachments if isinstance(item, PhotoItem)])
+        self.claim('videos', [(item.owner_id, item.id) for item in attachments if isinstance(item, VideoItem)])
+
+    def add_post_query(self, owner_id: int, post_id: int, query_id: int) -> None:
+        """
+        Связывает пост с запросом, по которому он найден
+        """
+        if self.is_new('post_queries', query_id, owner_id, post_id):
+            self.post_queries.append(PostQueryRecord(owner_id=owner_id, post_id=post_id, query_id=query_id))
+
+    def create_post(self, post: WallItem, query_id: int) -> PostRecord:
+        """
+        Создает пост, если он еще не сохранен. Уже сохраненный пост только связывается с запросом
+        """
+        self.add_post_query(post.owner_id, post.id, query_id)
+        if self.is_new('posts', post.owner_id, post.id):
+            post_obj = PostRecord(
+                id=post.id,
+                query_id=query_id,
+                type=post.type,
+                date=datetime.utcfromtimestamp(post.date),
+                from_id=post.from_id,
+                views_cnt=post.views,
+                likes_cnt=post.likes,
+                comments_cnt=post.comments,
+                reposts_cnt=post.reposts,
+                text=self.prepare_text(post.text),
+                owner_id=post.owner_id,
+                url=f"{self.domain}wall{post.owner_id}_{post.id}"
+            )
+            if AppConfig.get_full_text_store() and post.text:
+                post_obj.full_text = post.text
+            self.metrics.created['posts'].inc()
+            return post_obj
 
+    def set_post_attachments(self, post: PostRecord, attachments: list) -> None:
         """
-        if attachments:
-            for attachment in attachments:
-                if attachment['type'] == 'link':
-                    post.links.append(self.create_link_obj(attachment['link']))
-                elif attachment['type'] == 'photo':
-                    photo = self.create_photo_obj(attachment['photo'])
-                    if photo is not None:
-                        post.photos.append(photo)
-                elif attachment['type'] == 'video':
-                    video = self.create_video_obj(attachment['video'])
-                    if video is not None:
-                        post.videos.append(video)
 
-    def create_link_obj(self, attachment: dict) -> Link:
+        """
+        for attachment in attachments:
+            if isinstance(attachment, LinkItem):
+                post.links.append(self.create_link_obj(attachment))
+            elif isinstance(attachment, PhotoItem):
+                photo = self.create_photo_obj(attachment)
+                if photo is not None:
+                    post.photos.append(photo)
+            elif isinstance(attachment, VideoItem):
+                video = self.create_video_obj(attachment)
+                if video is not None:
+                    post.videos.append(video)
+
+    def create_link_obj(self, attachment: LinkItem) -> LinkRecord:
         """
 
         """
-        link = Link(
-            title=self.prepare_text(attachment['title']),
-            url=attachment['url'],
-            caption=attachment.get('caption', None),
-            description=self.prepare_text(attachment.get('description', None))
+        link = LinkRecord(
+            title=self.prepare_text(attachment.title),
+            url=attachment.url,
+            caption=attachment.caption,
+            description=self.prepare_text(attachment.description)
         )
         return link
 
-    def create_photo_obj(self, attachment: dict) -> Photo:
+    def create_photo_obj(self, attachment: PhotoItem) -> PhotoRecord:
         """
 
         """
-        url = attachment['orig_photo']['url'] if 'orig_photo' in attachment.keys() \
-            else self.choose_photo_max_size(attachment['sizes'])
-        if attachment['id'] not in self.photo_ids:
-            photo = Photo(
-                id=attachment['id'],
-                date=datetime.utcfromtimestamp(attachment['date']),
-                url=url,
-                text=self.prepare_text(attachment['text']),
-                owner_id=attachment['owner_id']
+        if self.is_new('photos', attachment.owner_id, attachment.id):
+            photo = PhotoRecord(
+                id=attachment.id,
+                date=datetime.utcfromtimestamp(attachment.date),
+                url=attachment.url,
+                text=self.prepare_text(attachment.text),
+                owner_id=attachment.owner_id
             )
-            self.photo_ids.append(photo.id)
+            self.metrics.created['photos'].inc()
             return photo
 
-    def create_video_obj(self, attachment: dict) -> Video:
+    def create_video_obj(self, attachment: VideoItem) -> VideoRecord:
         """
 
         """
-        if attachment['id'] not in self.video_ids:
-            video = Video(
-                id=attachment['id'],
-                date=datetime.utcfromtimestamp(attachment['date']),
-                title=self.prepare_text(attachment['title']),
-                description=self.prepare_text(attachment.get('description', None)),
-                views_cnt=attachment.get('views', None),
-                comments_cnt=attachment.get('comments', None),
-                duration=attachment.get('duration', None),
-                owner_id=attachment['owner_id']
+        if self.is_new('videos', attachment.owner_id, attachment.id):
+            video = VideoRecord(
+                id=attachment.id,
+                date=datetime.utcfromtimestamp(attachment.date),
+                title=self.prepare_text(attachment.title),
+                description=self.prepare_text(attachment.description),
+                views_cnt=attachment.views,
+                comments_cnt=attachment.comments,
+                duration=attachment.duration,
+                owner_id=attachment.owner_id
             )
-            self.video_ids.append(video.id)
+            self.metrics.created['videos'].inc()
             return video
 
-    def post_history_process(self, posts: list):
+    def post_history_process(self, history: list[tuple[WallItem, PostRecord]]):
         """
-
+        Добавляет новые посты из репостов, их владельцы обходятся следующим кругом
         """
-        for post in posts:
-            post_obj = self.create_post(post)
-            if post_obj is not None:
-                if not self.check_owner_exists(post['owner_id']):
-                    self.add_owner_id(post['owner_id'])
-                if 'attachments' in post.keys():
-                    self.set_post_attachments(post_obj, post['attachments'])
-                self.posts.append(post_obj)
+        for post, post_obj in history:
+            if not self.check_owner_exists(post.owner_id):
+                self.add_owner_id(post.owner_id)
+            self.set_post_attachments(post_obj, post.attachments)
+            self.posts.append(post_obj)
+            self.progress.add('posts')
 
     def add_owner_id(self, owner_id: int) -> None:
         """
 
         """
-        if owner_id >= 0:
-            self.ext_user_ids.append(owner_id)
-        else:
-            self.ext_group_ids.append(abs(owner_id))
+        with self.state_lock:
+            if owner_id >= 0:
+                self.ext_user_ids.append(owner_id)
+            else:
+                self.ext_group_ids.append(abs(owner_id))
 
-    @staticmethod
-    def choose_photo_max_size(sizes: dict):
+    def update_dedup_metrics(self) -> None:
         """
-
+        Обновляет размеры индексов дедупликации в метриках
         """
-        max_size = max(sizes, key=lambda x: x['width'])
-        return max_size['url']
+        for name, index in (('posts', self.post_index), ('photos', self.photo_index),
+                            ('videos', self.video_index), ('post_queries', self.post_query_index)):
+            self.metrics.dedup_size[name].set(len(index))
 
     def run(self, user_ids=None, group_ids=None):
+        """
+        Обходит стены владельцев. Если follow_reposts выключен, найденные в репостах владельцы
+        накапливаются в ext_user_ids/ext_group_ids и записываются в tOwners без обхода их стен
+        """
+        try:
+            self.crawl(user_ids, group_ids)
+        except BaseException as e:
+            self.logger.error(f'Crawl failed: {e!r}')
+            self.queue.fail(e)
+            raise
+        finally:
+            self.logger.info(self.api_stats.report())
+            self.logger.info(self.retry.stats.report())
+            self.logger.info(self.queue.report())
+            self.loop.run_until_complete(self.client.close())
+            self.loop.close()
+
+    def take_ext_owners(self) -> tuple[list, list]:
+        """
+        Забирает накопленные id владельцев из репостов
+        """
+        with self.state_lock:
+            user_ids, self.ext_user_ids = list(set(self.ext_user_ids)), []
+            group_ids, self.ext_group_ids = list(set(self.ext_group_ids)), []
+        return user_ids, group_ids
+
+    def crawl(self, user_ids=None, group_ids=None):
+        """
+        Обходит стены по кругам. Следующий круг по владельцам из репостов начинается,
+        когда менеджер разобрал все страницы предыдущего
+        """
         self.add_search_owners(user_ids, group_ids)
-        _offset = 0
         while True:
             iter_cnt = 1
-            while self.active_owners > 0:
+            while self.active_owners > 0 and not self.cancel_event.is_set():
                 self.logger.info(f'\n\nIter: {iter_cnt}  Active owners: {self.active_owners}\n')
-                self.ran_search_owner_wall(100, _offset)
-                _offset += 100
+                self.ran_search_owner_wall(100)
                 iter_cnt += 1
                 self.create_owners()
-            if self.ext_user_ids or self.ext_group_ids:
-                # print(f"{list(set(self.ext_user_ids))=}")
-                # print(f"{list(set(self.ext_group_ids))=}")
-                self.add_search_owners(list(set(self.ext_user_ids)), list(set(self.ext_group_ids)))
-                self.ext_group_ids = []
-                self.ext_user_ids = []
-            else:
-                self.queue.put(None)
+                self.update_dedup_metrics()
+            if self.cancel_event.is_set():
+                self.logger.info('Crawl cancelled')
+                self.create_owners()
+                self.queue.close()
                 break
+            self.queue.drain()
+            if self.follow_reposts:
+                ext_user_ids, ext_group_ids = self.take_ext_owners()
+                if ext_user_ids or ext_group_ids:
+                    self.add_search_owners(ext_user_ids, ext_group_ids)
+                    continue
+            else:
+                self.create_ext_owners()
+            self.queue.close()
+            break
 
 
 class DataExecutor:
     """
 
     """
-    __con_str = (f'{AppConfig.get_base_provider_name()}:/'
-                 f'/{AppConfig.get_user_id()}:{AppConfig.get_user_pwd()}@{AppConfig.get_db_host()}:'
-                 f'{AppConfig.get_db_port()}/{AppConfig.get_db_name()}')
 
-    def __init__(self):
-        self.engine = create_engine(url=self.__con_str, echo=False)
+    def __init__(self, url: str = None, metrics: CrawlMetrics = None):
+        self.engine = get_engine(url)
+        self.metrics = metrics
+        if metrics is not None:
+            observe_pool(self.engine, metrics)
         self.factory = sessionmaker(self.engine, expire_on_commit=True)
+        self.copy_supported = self.engine.dialect.name == 'postgresql' and self.engine.dialect.driver == 'psycopg'
+        self._posts_partitioned = None
+        self._post_key = None
+
+    @property
+    def posts_partitioned(self) -> bool:
+        """
+        tPosts секционирована по дате миграцией 0004, проверяется один раз
+        """
+        if self._posts_partitioned is None:
+            with self.engine.connect() as connection:
+                self._posts_partitioned = is_partitioned(connection)
+        return self._posts_partitioned
+
+    @property
+    def post_key(self) -> list[str]:
+        """
+        Колонки первичного ключа tPosts: (owner_id, id, date) в схеме моделей и после миграции 0005,
+        в базах на более ранних ревизиях - без owner_id или без date. Читаются из базы один раз
+        """
+        if self._post_key is None:
+            self._post_key = inspect(self.engine).get_pk_constraint(Post.__tablename__)['constrained_columns']
+        return self._post_key
+
+    def ensure_post_partitions(self) -> list[str]:
+        """
+        Создает недостающие секции tPosts на POSTS_PARTITION_AHEAD месяцев вперед
+        """
+        if not self.posts_partitioned:
+            return []
+        with self.engine.begin() as connection:
+            return ensure_post_partitions(connection, AppConfig.get_posts_partition_ahead())
+
+    # Модели и колонки ключей индексов дедупликации. Ключ из трех колонок хранится по группам первой колонки
+    dedup_models = {
+        'posts': (Post, 'owner_id', 'id'),
+        'photos': (Photo, 'owner_id', 'id'),
+        'videos': (Video, 'owner_id', 'id'),
+        'post_queries': (PostQuery, 'query_id', 'owner_id', 'post_id')
+    }
+
+    @classmethod
+    def empty_dedup_index(cls, name: str) -> DedupIndex | GroupedDedupIndex:
+        """
+        Создает пустой индекс дедупликации
+        """
+        return GroupedDedupIndex() if len(cls.dedup_models[name]) > 3 else DedupIndex()
+
+    def load_dedup_index(self, name: str) -> DedupIndex | GroupedDedupIndex:
+        """
+        Создает индекс дедупликации, в режиме upsert - пустой
+        """
+        if AppConfig.get_db_write_mode() == 'upsert':
+            return self.empty_dedup_index(name)
+        model, *columns = self.dedup_models[name]
+        keys = self.select_keys(model, *(getattr(model, column) for column in columns))
+        return GroupedDedupIndex(keys) if len(columns) > 2 else DedupIndex(keys)
 
     def get_query_id(self, query_str: str) -> int:
         """
@@ -490,16 +1027,125 @@ class DataExecutor:
             session.commit()
             return query.id
 
-    def select_ids(self, model) -> list[int]:
+    def select_keys(self, model, *columns) -> Iterator:
         """
+        Построчно выбирает ключи (по умолчанию (owner_id, id)) в порядке возрастания.
+        Две последние колонки упаковываются в int64, ключ из трех колонок возвращается парой (группа, упакованный ключ)
+        """
+        columns = columns or (model.owner_id, model.id)
+        with self.factory() as session:
+            query = select(*columns).order_by(*columns)
+            for row in session.execute(query.execution_options(yield_per=10_000)):
+                key = DedupIndex.pack(row[-2], row[-1])
+                yield key if len(row) == 2 else (row[0], key)
 
+    def get_crawl_marks(self, query_ids: list[int]) -> dict[tuple[int, int], tuple[int, int]]:
+        """
+        Возвращает отметки последнего сохраненного поста по парам владелец-запрос
         """
         with self.factory() as session:
-            query = select(model.id)
-            result = session.execute(query).all()
-            if result:
-                return [tpl[0] for tpl in result]
-            return []
+            query = select(CrawlMark).where(CrawlMark.query_id.in_(query_ids))
+            return {
+                (mark.owner_id, mark.query_id): (calendar.timegm(mark.last_date.utctimetuple()), mark.last_post_id)
+                for mark in session.scalars(query)
+            }
+
+    def save_crawl_marks(self, marks: dict[tuple[int, int], tuple[int, int]]) -> None:
+        """
+        Сохраняет отметки последнего полученного поста, не сдвигая их назад
+        """
+        query_ids = {query_id for _, query_id in marks.keys()}
+        with self.factory() as session:
+            query = select(CrawlMark).where(CrawlMark.query_id.in_(query_ids))
+            stored = {(mark.owner_id, mark.query_id): mark for mark in session.scalars(query)}
+            for (owner_id, query_id), (last_date, last_post_id) in marks.items():
+                mark = stored.get((owner_id, query_id))
+                if mark is None:
+                    session.add(CrawlMark(owner_id=owner_id, query_id=query_id,
+                                          last_date=datetime.utcfromtimestamp(last_date), last_post_id=last_post_id))
+                elif (calendar.timegm(mark.last_date.utctimetuple()), mark.last_post_id) < (last_date, last_post_id):
+                    mark.last_date = datetime.utcfromtimestamp(last_date)
+                    mark.last_post_id = last_post_id
+            session.commit()
+
+    def get_checkpoint(self, job_id: str) -> tuple[dict, dict] | None:
+        """
+        Возвращает параметры и состояние обхода из контрольной точки
+        """
+        with self.factory() as session:
+            checkpoint = session.scalars(select(CrawlCheckpoint).where(CrawlCheckpoint.job_id == job_id)).first()
+            if checkpoint is None:
+                return None
+            return json.loads(checkpoint.params), json.loads(checkpoint.state)
+
+    def get_checkpoints(self) -> list[dict]:
+        """
+        Возвращает сохраненные контрольные точки без состояния
+        """
+        with self.factory() as session:
+            return [
+                {'job_id': checkpoint.job_id, 'updated': checkpoint.updated.isoformat(),
+                 **json.loads(checkpoint.params)}
+                for checkpoint in session.scalars(select(CrawlCheckpoint).order_by(CrawlCheckpoint.updated))
+            ]
+
+    def save_checkpoint(self, job_id: str, state: dict, params: dict = None) -> None:
+        """
+        Сохраняет состояние обхода, параметры записываются при создании контрольной точки
+        """
+        with self.factory() as session:
+            checkpoint = session.scalars(select(CrawlCheckpoint).where(CrawlCheckpoint.job_id == job_id)).first()
+            if checkpoint is None:
+                checkpoint = CrawlCheckpoint(job_id=job_id, params=json.dumps(params or {}, ensure_ascii=False))
+                session.add(checkpoint)
+            checkpoint.state = json.dumps(state, ensure_ascii=False)
+            checkpoint.updated = datetime.utcnow()
+            session.commit()
+
+    def delete_checkpoint(self, job_id: str) -> None:
+        """
+        Удаляет контрольную точку завершенного обхода
+        """
+        with self.factory() as session:
+            session.execute(delete(CrawlCheckpoint).where(CrawlCheckpoint.job_id == job_id))
+            session.commit()
+
+    def search_posts(self, query: str, limit: int = 100, owner_id: int = None,
+                     date_from: datetime = None, date_to: datetime = None) -> list[dict]:
+        """
+        Ищет посты по полному тексту из tPostTexts.
+        В PostgreSQL используется индекс tsvector и ранжирование, в остальных базах - поиск подстроки
+        """
+        columns = [Post.id, Post.owner_id, Post.date, Post.url]
+        is_postgresql = self.engine.dialect.name == 'postgresql'
+        if is_postgresql:
+            tsquery = func.websearch_to_tsquery(AppConfig.get_full_text_language(), query)
+            rank = func.ts_rank(literal_column('"tPostTexts".tsv'), tsquery)
+            headline = func.ts_headline(AppConfig.get_full_text_language(), PostText.text, tsquery)
+            stmt = select(*columns, rank.label('rank'), headline.label('fragment')) \
+                .where(literal_column('"tPostTexts".tsv').op('@@')(tsquery)) \
+                .order_by(rank.desc(), Post.date.desc())
+        else:
+            stmt = select(*columns, PostText.text.label('fragment')) \
+                .where(PostText.text.ilike(f'%{query}%')) \
+                .order_by(Post.date.desc())
+        stmt = stmt.join(Post, (Post.owner_id == PostText.owner_id) & (Post.id == PostText.post_id))
+        if owner_id is not None:
+            stmt = stmt.where(PostText.owner_id == owner_id)
+        if date_from is not None:
+            stmt = stmt.where(Post.date >= date_from)
+        if date_to is not None:
+            stmt = stmt.where(Post.date < date_to)
+        matcher = None if is_postgresql else TextMatcher([query], stem=False)
+        with self.factory() as session:
+            result = []
+            for row in session.execute(stmt.limit(limit)):
+                item = {'id': row.id, 'owner_id': row.owner_id, 'date': row.date.isoformat(), 'url': row.url,
+                        'fragment': row.fragment if is_postgresql else matcher.fragment(row.fragment)}
+                if is_postgresql:
+                    item['rank'] = row.rank
+                result.append(item)
+            return result
 
     def get_owner_ids(self) -> list[int]:
         """
@@ -512,6 +1158,29 @@ class DataExecutor:
                 return [row[0] for row in result]
             return []
 
+    def find_owners(self, user_keys: list, group_keys: list) -> tuple[list[dict], list[dict]]:
+        """
+        Ищет владельцев в tOwners по id и коротким именам.
+        Возвращает их в виде ответов users.get и groups.getById
+        """
+        user_ids = [int(key) for key in user_keys if str(key).isdigit()]
+        group_ids = [-int(key) for key in group_keys if str(key).isdigit()]
+        domains = [str(key) for key in user_keys + group_keys if not str(key).isdigit()]
+        if not user_ids and not group_ids and not domains:
+            return [], []
+        with self.factory() as session:
+            query = select(Owner).where(Owner.id.in_(user_ids + group_ids) | Owner.domain.in_(domains))
+            users = []
+            groups = []
+            for owner in session.scalars(query):
+                if owner.id > 0:
+                    users.append({'id': owner.id, 'domain': owner.domain, 'first_name': owner.first_name,
+                                  'last_name': owner.last_name, 'is_closed': owner.is_closed})
+                else:
+                    groups.append({'id': -owner.id, 'screen_name': owner.domain, 'name': owner.name,
+                                   'is_closed': int(owner.is_closed)})
+            return users, groups
+
     def get_owners(self) -> list[SearchOwner]:
         """
 
@@ -541,3 +1210,163 @@ class DataExecutor:
         with self.factory() as session:
             session.add_all(data)
             session.commit()
+
+    def write(self, owners: list[OwnerRecord], posts: list[PostRecord],
+              post_queries: list[PostQueryRecord] = ()) -> None:
+        """
+        Записывает владельцев, посты и связи постов с запросами способом, заданным в AppConfig.
+        Объекты моделей создаются из записей только для записи через ORM
+        """
+        write_mode = AppConfig.get_db_write_mode()
+        start = perf_counter()
+        try:
+            if write_mode == 'orm':
+                texts = [text_obj for text_obj in map(to_text_model, posts) if text_obj is not None]
+                owner_columns = self.get_columns(Owner)
+                with self.engine.begin() as connection:
+                    self.insert_owners(connection, owner_columns,
+                                       [tuple(getattr(owner, name) for name in owner_columns) for owner in owners])
+                self.export_data([to_model(record) for record in posts + list(post_queries)] + texts)
+            elif write_mode == 'upsert':
+                self.export_upsert(owners, posts, post_queries)
+            else:
+                self.export_bulk(owners, posts, post_queries)
+        except Exception:
+            if self.metrics is not None:
+                self.metrics.db_flush_errors.inc()
+            raise
+        if self.metrics is not None:
+            self.metrics.observe_flush(perf_counter() - start, len(owners) + len(posts) + len(post_queries))
+
+    @staticmethod
+    def get_columns(model, exclude: tuple = ()) -> list[str]:
+        """
+        Возвращает имена колонок таблицы модели
+        """
+        return [column.name for column in model.__table__.columns if column.name not in exclude]
+
+    def prepare_rows(self, owners: list[OwnerRecord], posts: list[PostRecord],
+                     post_queries: list[PostQueryRecord] = ()) -> list[tuple]:
+        """
+        Раскладывает записи или объекты моделей по таблицам в порядке зависимостей внешних ключей.
+        Возвращает список (модель, колонки, строки)
+        """
+        owner_columns = self.get_columns(Owner)
+        post_columns = self.get_columns(Post)
+        link_columns = self.get_columns(Link, exclude=('id', 'post_owner_id', 'post_id'))
+        photo_columns = self.get_columns(Photo, exclude=('post_owner_id', 'post_id'))
+        video_columns = self.get_columns(Video, exclude=('post_owner_id', 'post_id'))
+        post_ref_columns = ['post_owner_id', 'post_id']
+        post_query_columns = self.get_columns(PostQuery, exclude=('id',))
+        post_text_columns = self.get_columns(PostText, exclude=('id',))
+        owner_rows = [tuple(getattr(owner, name) for name in owner_columns) for owner in owners]
+        post_rows = []
+        link_rows = []
+        photo_rows = []
+        video_rows = []
+        post_text_rows = []
+        for post in posts:
+            post_ref = (post.owner_id, post.id)
+            post_rows.append(tuple(getattr(post, name) for name in post_columns))
+            full_text = getattr(post, 'full_text', None)
+            if full_text:
+                post_text_rows.append((post.owner_id, post.id, full_text))
+            for link in post.links:
+                link_rows.append(tuple(getattr(link, name) for name in link_columns) + post_ref)
+            for photo in post.photos:
+                photo_rows.append(tuple(getattr(photo, name) for name in photo_columns) + post_ref)
+            for video in post.videos:
+                video_rows.append(tuple(getattr(video, name) for name in video_columns) + post_ref)
+        return [
+            (Owner, owner_columns, owner_rows),
+            (Post, post_columns, post_rows),
+            (PostText, post_text_columns, post_text_rows),
+            (Link, link_columns + post_ref_columns, link_rows),
+            (Photo, photo_columns + post_ref_columns, photo_rows),
+            (Video, video_columns + post_ref_columns, video_rows),
+            (PostQuery, post_query_columns,
+             [tuple(getattr(post_query, name) for name in post_query_columns) for post_query in post_queries])
+        ]
+
+    def export_bulk(self, owners: list[OwnerRecord], posts: list[PostRecord],
+                    post_queries: list[PostQueryRecord] = ()) -> None:
+        """
+        Записывает данные одной транзакцией через COPY,
+        если драйвер его не поддерживает - через executemany. Владельцы пропускаются, если уже записаны
+        """
+        tables = self.prepare_rows(owners, posts, post_queries)
+        with self.engine.begin() as connection:
+            for model, columns, rows in tables:
+                if not rows:
+                    continue
+                if model is Owner:
+                    self.insert_owners(connection, columns, rows)
+                elif self.copy_supported:
+                    self.copy_rows(connection, model, columns, rows)
+                else:
+                    connection.execute(insert(model), [dict(zip(columns, row)) for row in rows])
+
+    def insert_owners(self, connection, columns: list[str], rows: list[tuple]) -> None:
+        """
+        Добавляет владельцев, пропуская уже записанных.
+        Владельцев из репостов записывают все шарды, которые их нашли
+        """
+        if not rows:
+            return
+        dialect = postgresql if self.engine.dialect.name == 'postgresql' else sqlite
+        stmt = dialect.insert(Owner).on_conflict_do_nothing(index_elements=['id'])
+        connection.execute(stmt, [dict(zip(columns, row)) for row in rows])
+
+    def export_upsert(self, owners: list[OwnerRecord], posts: list[PostRecord],
+                      post_queries: list[PostQueryRecord] = ()) -> None:
+        """
+        Записывает данные через INSERT ... ON CONFLICT.
+        Для существующих постов и видео обновляются счетчики, ссылки постов перезаписываются
+        """
+        dialect = postgresql if self.engine.dialect.name == 'postgresql' else sqlite
+        tables = self.prepare_rows(owners, posts, post_queries)
+        with self.engine.begin() as connection:
+            for model, columns, rows in tables:
+                if not rows:
+                    continue
+                stmt = dialect.insert(model)
+                update_columns = self.upsert_columns.get(model)
+                if model is Link:
+                    connection.execute(delete(Link).where(
+                        tuple_(Link.post_owner_id, Link.post_id).in_({row[-2:] for row in rows})
+                    ))
+                elif update_columns:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=self.post_key if model is Post else self.conflict_columns.get(model, ['id']),
+                        set_={name: stmt.excluded[name] for name in update_columns}
+                    )
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=self.conflict_columns.get(model, ['id']))
+                connection.execute(stmt, [dict(zip(columns, row)) for row in rows])
+
+    # Колонки, обновляемые при повторной записи существующей строки
+    upsert_columns = {
+        Owner: ('domain', 'url', 'name', 'first_name', 'last_name', 'is_closed'),
+        Post: ('views_cnt', 'likes_cnt', 'comments_cnt', 'reposts_cnt'),
+        Video: ('views_cnt', 'comments_cnt')
+    }
+
+    # Колонки уникального ключа для таблиц, у которых он отличается от id. Ключ tPosts читается из базы
+    conflict_columns = {
+        Photo: ['owner_id', 'id'],
+        Video: ['owner_id', 'id'],
+        PostQuery: ['owner_id', 'post_id', 'query_id'],
+        PostText: ['owner_id', 'post_id']
+    }
+
+    @staticmethod
+    def copy_rows(connection, model, columns: list[str], rows: list[tuple]) -> None:
+        """
+        Загружает строки в таблицу через COPY FROM STDIN
+        """
+        column_list = ', '.join(f'"{name}"' for name in columns)
+        statement = f'COPY "{model.__tablename__}" ({column_list}) FROM STDIN'
+        with connection.connection.driver_connection.cursor() as cursor:
+            with cursor.copy(statement) as copy:
+                for row in rows:
+                    copy.write_row(row)
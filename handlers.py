@@ -1,18 +1,124 @@
-from multiprocessing import Process
+from threading import Lock
 
+from config import AppConfig
+from executors import DataExecutor
+from jobs import Job
 from manager import start_service
+from metrics import render
+from sharding import run_sharded
 
 
 class RequestHandler:
     """
-
+    Реестр запущенных обходов.
+    API обслуживает запросы в нескольких потоках, проверка лимита и запуск обхода выполняются под блокировкой
     """
-    @staticmethod
-    def start():
+
+    # Количество завершенных обходов, которые хранятся в реестре
+    history_size = 100
+
+    def __init__(self):
+        self.jobs = {}
+        self._executor = None
+        self._lock = Lock()
+
+    @property
+    def executor(self) -> DataExecutor:
+        if self._executor is None:
+            self._executor = DataExecutor()
+        return self._executor
+
+    def running_jobs(self) -> list[Job]:
+        return [job for job in self.jobs.values() if job.is_alive]
+
+    def _free_slot(self) -> int:
+        """
+        Возвращает наименьший слот, не занятый запущенными обходами
+        """
+        used = {job.slot for job in self.running_jobs()}
+        return min(set(range(len(used) + 1)) - used)
+
+    def start(self, queries: list[str], users: list, groups: list) -> Job | None:
+        """
+        Запускает обход, если не превышен лимит одновременных обходов
+        """
+        with self._lock:
+            if len(self.running_jobs()) >= AppConfig.get_max_jobs():
+                return None
+            self._clean_history()
+            job = Job(queries, users, groups)
+            if AppConfig.get_crawl_workers() > 1:
+                job.start(run_sharded, self._free_slot(), daemon=False)
+            else:
+                job.start(start_service, self._free_slot())
+            self.jobs[job.id] = job
+            return job
+
+    def resume(self, job_id: str) -> Job | None:
         """
+        Продолжает обход с контрольной точки в одном процессе.
+        Если контрольной точки нет, вызывает LookupError
+        """
+        checkpoint = self.executor.get_checkpoint(job_id)
+        if checkpoint is None:
+            raise LookupError(job_id)
+        params, _ = checkpoint
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is not None and job.is_alive:
+                return job
+            if len(self.running_jobs()) >= AppConfig.get_max_jobs():
+                return None
+            self._clean_history()
+            job = Job(params.get('queries', []), params.get('users', []), params.get('groups', []), job_id)
+            job.start(start_service, self._free_slot())
+            self.jobs[job.id] = job
+            return job
 
+    def get_checkpoints(self) -> list[dict]:
+        """
+        Возвращает обходы, которые можно продолжить
         """
-        process = Process(target=start_service)
-        process.daemon = True
-        process.start()
+        return self.executor.get_checkpoints()
 
+    def search(self, query: str, limit: int = 100, owner_id: int = None) -> list[dict]:
+        """
+        Ищет сохраненные посты по полному тексту
+        """
+        return self.executor.search_posts(query, limit=limit, owner_id=owner_id)
+
+    def stop(self, job_id: str) -> Job | None:
+        """
+        Отправляет обходу запрос на остановку
+        """
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def get_status(self, job_id: str) -> dict | None:
+        """
+        Возвращает статус и прогресс обхода
+        """
+        job = self.jobs.get(job_id)
+        return job.to_dict() if job is not None else None
+
+    def get_statuses(self) -> list[dict]:
+        """
+        Возвращает статусы всех обходов из реестра
+        """
+        return [job.to_dict() for job in self.jobs.values()]
+
+    def get_metrics(self) -> str:
+        """
+        Возвращает метрики обходов из реестра в текстовом формате Prometheus
+        """
+        return render([({'job_id': job.id}, job.progress.metrics) for job in self.jobs.values()])
+
+    def _clean_history(self) -> None:
+        """
+        Удаляет самые старые завершенные обходы сверх history_size
+        """
+        finished = [job_id for job_id, job in self.jobs.items() if not job.is_alive]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self.jobs[job_id]
@@ -0,0 +1,95 @@
+import time
+import uuid
+from multiprocessing import Event, Process, Value
+
+from metrics import CrawlMetrics
+
+
+class JobProgress:
+    """
+    Счетчики прогресса и метрики обхода, разделяемые между процессом обхода и API
+    """
+    fields = ('active_owners', 'pages', 'posts')
+
+    def __init__(self):
+        self.active_owners = Value('q', 0)
+        self.pages = Value('q', 0)
+        self.posts = Value('q', 0)
+        self.started = Value('d', time.time())
+        self.finished = Value('d', 0.0)
+        self.metrics = CrawlMetrics()
+
+    def add(self, name: str, value: int = 1) -> None:
+        counter = getattr(self, name)
+        with counter.get_lock():
+            counter.value += value
+
+    def set(self, name: str, value) -> None:
+        getattr(self, name).value = value
+
+    def to_dict(self) -> dict:
+        end = self.finished.value or time.time()
+        elapsed = max(end - self.started.value, 1e-9)
+        result = {name: getattr(self, name).value for name in self.fields}
+        result['posts_per_sec'] = round(self.posts.value / elapsed, 2)
+        result['elapsed_sec'] = round(elapsed, 1)
+        return result
+
+
+class Job:
+    """
+    Запущенный обход стен в отдельном процессе
+    """
+
+    def __init__(self, queries: list[str], users: list, groups: list, job_id: str = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.queries = queries
+        self.users = users
+        self.groups = groups
+        self.progress = JobProgress()
+        self.cancel_event = Event()
+        self.slot = None
+        self.process = None
+
+    def start(self, target, slot: int, daemon: bool = True) -> None:
+        """
+        Запускает процесс обхода в слоте slot.
+        Имя процесса по слоту используется в имени файла логов.
+        Процесс, который сам запускает дочерние процессы, не может быть демоном
+        """
+        self.slot = slot
+        self.process = Process(
+            target=target,
+            name=f'job{slot}',
+            args=(self.queries, self.users, self.groups, self.progress, self.cancel_event, self.id)
+        )
+        self.process.daemon = daemon
+        self.process.start()
+
+    def cancel(self) -> None:
+        """
+        Просит процесс обхода остановиться после текущей страницы
+        """
+        self.cancel_event.set()
+
+    @property
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    @property
+    def status(self) -> str:
+        if self.is_alive:
+            return 'cancelling' if self.cancel_event.is_set() else 'running'
+        if self.process is None or self.process.exitcode != 0:
+            return 'failed'
+        return 'cancelled' if self.cancel_event.is_set() else 'finished'
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'queries': self.queries,
+            'users': self.users,
+            'groups': self.groups,
+            'progress': self.progress.to_dict()
+        }
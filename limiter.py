@@ -0,0 +1,134 @@
+import asyncio
+import time
+from threading import Lock
+
+
+class NoActiveTokensError(Exception):
+    """
+    Все ключи доступа выведены из ротации
+    """
+    pass
+
+
+class TokenBucket:
+    """
+    Корзина токенов для одного ключа доступа.
+    Запрос резервирует токен заранее, поэтому баланс может уходить в минус,
+    а время ожидания определяется глубиной долга
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self.is_active = True
+
+    def _refill(self) -> None:
+        """
+        Начисляет токены за прошедшее время
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """
+        Возвращает время ожидания следующего токена
+        """
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def consume(self) -> float:
+        """
+        Резервирует токен и возвращает время ожидания до его готовности
+        """
+        self._refill()
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def penalize(self, seconds: float) -> None:
+        """
+        Откладывает следующие запросы на указанное время
+        """
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+class TokenPool:
+    """
+    Планировщик запросов по нескольким ключам доступа.
+    Запрос получает ключ с наименьшей загрузкой, у каждого ключа своя корзина токенов
+    """
+
+    # Коды ошибок vk api, при которых ключ выводится из ротации
+    disable_codes = {5: 'authorization failed', 28: 'application authorization failed', 29: 'rate limit reached'}
+
+    # Коды ошибок vk api, при которых ключ временно притормаживается
+    throttle_codes = {6, 9}
+
+    def __init__(self, tokens: list[str], rate: float, capacity: float, logger=None):
+        self.buckets = {token: TokenBucket(rate, capacity) for token in tokens}
+        self.logger = logger
+        self._lock = Lock()
+
+    @staticmethod
+    def mask(token: str) -> str:
+        """
+        Возвращает ключ в виде, пригодном для логирования
+        """
+        return token[:6] + '...'
+
+    @property
+    def active_cnt(self) -> int:
+        return sum(1 for bucket in self.buckets.values() if bucket.is_active)
+
+    def reserve(self) -> tuple[str, float]:
+        """
+        Выбирает наименее загруженный ключ и резервирует для него токен
+        """
+        with self._lock:
+            active = [(token, bucket) for token, bucket in self.buckets.items() if bucket.is_active]
+            if not active:
+                raise NoActiveTokensError('No active VK access tokens')
+            token, bucket = min(active, key=lambda item: (item[1].delay(), item[1].in_flight))
+            bucket.in_flight += 1
+            return token, bucket.consume()
+
+    def acquire(self) -> str:
+        """
+        Возвращает ключ, дождавшись его очереди
+        """
+        token, wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        return token
+
+    async def acquire_async(self) -> str:
+        """
+        Возвращает ключ, дождавшись его очереди, без блокировки цикла событий
+        """
+        token, wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        return token
+
+    def release(self, token: str, error_code: int = None) -> None:
+        """
+        Освобождает ключ после запроса и учитывает код ошибки vk api
+        """
+        with self._lock:
+            bucket = self.buckets[token]
+            bucket.in_flight -= 1
+            if error_code in self.disable_codes and bucket.is_active:
+                bucket.is_active = False
+                self._log(f'Token {self.mask(token)} disabled: {self.disable_codes[error_code]}. '
+                          f'Active tokens: {self.active_cnt}')
+            elif error_code in self.throttle_codes:
+                bucket.penalize(1.0)
+                self._log(f'Token {self.mask(token)} throttled: error {error_code}')
+
+    def _log(self, message: str) -> None:
+        if self.logger is not None:
+            self.logger.warning(message)
@@ -1,12 +1,146 @@
 import abc
-import datetime
+import atexit
 import logging
+import logging.handlers
+import multiprocessing
 import os
 import pathlib
+import queue
+import threading
 
 from config import AppConfig
 
 
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """
+    Обработчик для файлов, ротация по времени или по размеру файла.
+    Архивы называются <файл>.<период>.<номер>, номер растет с каждой ротацией за период
+    """
+
+    def __init__(self, filename, max_bytes: int, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+        self.namer = self._indexed_name
+        self._last_indexes = {}
+
+    def _archives(self) -> list[tuple[str, int, str]]:
+        """
+        Возвращает архивы файла в виде (период, номер, путь), от старых к новым
+        """
+        dir_name, base_name = os.path.split(self.baseFilename)
+        archives = []
+        for name in os.listdir(dir_name):
+            if not name.startswith(base_name + '.'):
+                continue
+            period, _, index = name[len(base_name) + 1:].rpartition('.')
+            if period and index.isdigit():
+                archives.append((period, int(index), os.path.join(dir_name, name)))
+        archives.sort()
+        return archives
+
+    def _indexed_name(self, default_name: str) -> str:
+        """
+        Добавляет к имени архивного файла номер ротации за период.
+        Последний номер берется из каталога при первой ротации за период, дальше считается в обработчике
+        """
+        index = self._last_indexes.get(default_name)
+        if index is None:
+            period = default_name[len(self.baseFilename) + 1:]
+            index = max((i for p, i, _ in self._archives() if p == period), default=0)
+        index += 1
+        self._last_indexes = {default_name: index}
+        return f'{default_name}.{index:03d}'
+
+    def getFilesToDelete(self):
+        """
+        Возвращает самые старые архивы сверх backupCount.
+        Периоды в формате суффикса сортируются по времени, номера внутри периода - по порядку ротации
+        """
+        archives = self._archives()
+        if len(archives) <= self.backupCount:
+            return []
+        return [path for _, _, path in archives[:len(archives) - self.backupCount]]
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes > 0 and self.stream is not None:
+            self.stream.seek(0, 2)
+            return self.stream.tell() >= self.max_bytes
+        return False
+
+
+class LogBackend:
+    """
+    Общий для процесса обработчик логов.
+    Логгеры пишут записи в очередь, запись в консоль и файлы выполняет отдельный поток
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.queue = queue.SimpleQueue()
+        self.handlers = {}
+        self.queue_handlers = {}
+        self.lock = threading.Lock()
+        self.listener = logging.handlers.QueueListener(self.queue, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """
+        Дописывает оставшиеся записи и останавливает поток записи
+        """
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+
+    def register(self, logger_name: str, handlers: list) -> logging.Handler:
+        """
+        Регистрирует обработчики логгера один раз и возвращает его обработчик очереди
+        """
+        with self.lock:
+            if logger_name not in self.queue_handlers:
+                for handler in handlers:
+                    handler.addFilter(logging.Filter(logger_name))
+                self.handlers[logger_name] = handlers
+                self.listener.handlers = tuple(
+                    handler for name_handlers in self.handlers.values() for handler in name_handlers
+                )
+                self.queue_handlers[logger_name] = logging.handlers.QueueHandler(self.queue)
+            return self.queue_handlers[logger_name]
+
+    def unregister(self, logger_name: str) -> None:
+        """
+        Удаляет обработчики логгера
+        """
+        with self.lock:
+            for handler in self.handlers.pop(logger_name, []):
+                handler.close()
+            self.queue_handlers.pop(logger_name, None)
+            self.listener.handlers = tuple(
+                handler for name_handlers in self.handlers.values() for handler in name_handlers
+            )
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> LogBackend:
+    """
+    Возвращает обработчик логов текущего процесса.
+    После fork поток записи родителя недоступен, поэтому создается новый обработчик
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None or _backend.pid != os.getpid():
+            if _backend is not None:
+                for logger_name in _backend.queue_handlers:
+                    logging.getLogger(logger_name).handlers.clear()
+            _backend = LogBackend()
+        return _backend
+
+
 class Logger(abc.ABC):
     """
     Базовый класс для логирования
@@ -31,9 +165,14 @@ class Logger(abc.ABC):
     @property
     def log_file(self):
         """
-        Свойство, возвращает наименование файла для логирования
+        Свойство, возвращает наименование файла для логирования.
+        Дочерние процессы пишут в файл своего слота (имя процесса, например job0.shard1):
+        ротация одного файла из нескольких процессов небезопасна, а число слотов ограничено
+        лимитом обходов и воркеров, поэтому файлы переиспользуются и попадают под ротацию
         """
-        return f"{datetime.datetime.now().strftime('%Y_%m_%d__%H_%M_%S')}.log"
+        if multiprocessing.parent_process() is None:
+            return f"{self.logger_name}.log"
+        return f"{self.logger_name}.{multiprocessing.current_process().name}.log"
 
     file_format = '%(asctime)-5s %(name)-15s %(levelname)-8s %(message)s'
     console_format = '%(asctime)-5s %(name)-15s %(levelname)-8s %(message)s'
@@ -51,16 +190,23 @@ class Logger(abc.ABC):
     def _prepare_logger(self):
         """
         Запрос экземпляра через фабрику и настройка
-        Добавление обработчиков
+        Обработчики создаются один раз на процесс, записи передаются через очередь
         """
         self._logger = logging.getLogger(self.logger_name)
-        self._logger.setLevel(logging.DEBUG)
-
-        if self.log_to_console:
-            self._logger.addHandler(self._console_handler())
-
-        if self.log_to_file:
-            self._logger.addHandler(self._file_handler())
+        self._logger.setLevel(AppConfig.get_log_level(self.logger_name))
+        self._logger.propagate = False
+
+        handlers = []
+        backend = get_backend()
+        if self.logger_name not in backend.queue_handlers:
+            if self.log_to_console:
+                handlers.append(self._console_handler())
+            if self.log_to_file:
+                handlers.append(self._file_handler())
+        queue_handler = backend.register(self.logger_name, handlers)
+        if queue_handler not in self._logger.handlers:
+            self._logger.handlers.clear()
+            self._logger.addHandler(queue_handler)
 
     def _console_handler(self):
         """
@@ -79,7 +225,13 @@ class Logger(abc.ABC):
         """
         self._create_folder()
         _file = self.log_folder + os.sep + self.log_file
-        handler = logging.FileHandler(filename=_file)
+        handler = SizedTimedRotatingFileHandler(
+            filename=_file,
+            max_bytes=AppConfig.get_log_max_bytes(),
+            when='midnight',
+            backupCount=AppConfig.get_log_backup_count(),
+            encoding='utf-8'
+        )
         handler.setLevel(logging.DEBUG)
         handler.setFormatter(
             logging.Formatter(self.file_format)
@@ -98,6 +250,7 @@ class Logger(abc.ABC):
         Необходимо при перезапуске расчета
         """
         self._logger.handlers.clear()
+        get_backend().unregister(self.logger_name)
         if logging.Logger.manager.loggerDict.get(self.logger_name, False):
             del logging.Logger.manager.loggerDict[self.logger_name]
 
@@ -1,43 +1,118 @@
-from queue import Queue
+import time
 from threading import Thread
 from datetime import datetime
 
 from config import AppConfig
 from executors import ApiParser, DataExecutor
+from jobs import JobProgress
+from channel import PageChannel, PageMessage, ErrorMessage
 from logger import ManagerLogger
+from writers import StreamWriter
 
 
 class AppManager:
     """
 
     """
-    def __init__(self, api_v: str, token: str, query: str):
+    def __init__(self, api_v: str, tokens: list[str], queries: list[str], progress: JobProgress = None,
+                 cancel_event=None, shard: tuple[int, int] = (0, 1), indexes: dict = None, job_id: str = None):
         self.logger = ManagerLogger()
-        self.queue = Queue()
-        self.parser = ApiParser(api_v, token, query, self.queue)
-        self.executor = DataExecutor()
+        self.job_id = job_id
+        self.queue = PageChannel(AppConfig.get_page_queue_size())
+        self.progress = progress if progress is not None else JobProgress()
+        self.parser = ApiParser(api_v, tokens, queries, self.queue, self.progress, cancel_event, shard, indexes)
+        self.executor = DataExecutor(metrics=self.progress.metrics)
+        self.batch_size = AppConfig.get_db_batch_size()
+        self.writer = StreamWriter(self.executor, self.logger, AppConfig.get_db_writer_queue_size(), job_id)
+        self.checkpoint_interval = AppConfig.get_checkpoint_interval()
+        self.checkpoint_time = time.monotonic()
+        self.parser_error = None
+        self.checkpoint = self.executor.get_checkpoint(job_id) if job_id is not None else None
+        if self.checkpoint is not None:
+            self.parser.restore(self.checkpoint[1])
+            self.writer.restore(self.checkpoint[1])
 
     def listen_queue(self, stop_date=None):
         while True:
-            wall = self.queue.get()
-            if wall is None:
+            message = self.queue.get()
+            if isinstance(message, ErrorMessage):
+                self.logger.error(f'Parser stopped with error: {message.error!r}')
+                self.parser_error = message.error
                 break
-            self.parser.check_wall(wall['owner'], wall['wall_json'], 100)
-            self.parser.create_owner_posts(wall['owner'], wall['wall_json']['items'], stop_date)
+            if not isinstance(message, PageMessage):
+                break
+            self.parser.create_owner_posts(message.cursor, message.items, stop_date)
+            message.cursor.done_offset = message.offset
+            if len(self.parser.posts) >= self.batch_size or self.checkpoint_due():
+                self.export_result()
+            self.queue.task_done()
         self.parser.create_owners()
 
+    def checkpoint_due(self) -> bool:
+        """
+        Проверяет, что с последней контрольной точки прошло больше CHECKPOINT_INTERVAL
+        """
+        return self.job_id is not None and time.monotonic() - self.checkpoint_time >= self.checkpoint_interval
+
     def export_result(self):
-        insert_data = self.parser.owners + self.parser.posts
-        self.executor.export_data(insert_data)
+        with self.parser.state_lock:
+            owners, self.parser.owners = self.parser.owners, []
+        posts, self.parser.posts = self.parser.posts, []
+        post_queries, self.parser.post_queries = self.parser.post_queries, []
+        state = None
+        if self.job_id is not None:
+            state = self.parser.get_checkpoint()
+            self.checkpoint_time = time.monotonic()
+        self.writer.write(owners, posts, post_queries, state)
 
-    def run(self):
+    def is_complete(self) -> bool:
+        """
+        Проверяет, что обход не прерван, ни одна стена не осталась недообойденной из-за ошибок запросов
+        и все пачки записаны, иначе контрольная точка сохраняется для продолжения
         """
+        return (self.parser_error is None and not self.parser.cancel_event.is_set() and not self.writer.failed_cnt
+                and not self.parser.has_failed_cursors())
 
+    def save_crawl_marks(self):
+        """
+        Сохраняет отметки последних постов после того, как все посты записаны
+        """
+        if self.writer.failed_cnt:
+            self.logger.warning(f"Crawl marks are not saved: {self.writer.failed_cnt} batches failed")
+            return
+        self.executor.save_crawl_marks(self.parser.get_crawl_marks())
+
+    def run(self, user_ids: list = None, group_ids: list = None):
+        """
+        Запускает обход стен. Без пользователей и групп обходятся все сохраненные владельцы
         """
+        if user_ids or group_ids:
+            args = (user_ids or [], group_ids or [])
+        else:
+            args = (None, None)
         start = datetime.now()
-        Thread(target=self.parser.run, args=(users, groups)).start()
-        self.listen_queue()
+        self.executor.ensure_post_partitions()
+        if self.job_id is not None and self.checkpoint is None:
+            self.executor.save_checkpoint(
+                self.job_id, {}, {'queries': self.parser.queries, 'users': user_ids or [], 'groups': group_ids or []}
+            )
+        self.writer.start()
+        Thread(target=self.parser.run, args=args).start()
+        try:
+            self.listen_queue()
+        except BaseException:
+            self.parser.cancel_event.set()
+            self.queue.abort()
+            raise
         self.export_result()
+        self.writer.close()
+        self.save_crawl_marks()
+        if self.job_id is not None and self.is_complete():
+            self.executor.delete_checkpoint(self.job_id)
+        if self.parser_error is not None:
+            raise self.parser_error
+        if self.parser.follow_reposts:
+            self.progress.set('finished', time.time())
         self.logger.info(f"\n\n   Total time: {datetime.now() - start}\n\n")
 
 
@@ -56,13 +131,17 @@ groups = ['pva_anapa', 'anapavputi']
 #     "ruopp"
 # ]
 # groups = ['pva_anapa']
-QUERY = ['видео']
+QUERY = ['Путин', 'видео']
 
 
-def start_service():
-    app_manager = AppManager(AppConfig.get_vk_api_version(), AppConfig.get_vk_access_token(), 'Путин')
-    app_manager.run()
+def start_service(queries: list[str], user_ids: list, group_ids: list, progress: JobProgress = None,
+                  cancel_event=None, job_id: str = None):
+    app_manager = AppManager(
+        AppConfig.get_vk_api_version(), AppConfig.get_vk_access_tokens(), queries, progress, cancel_event,
+        job_id=job_id
+    )
+    app_manager.run(user_ids, group_ids)
 
 
 if __name__ == '__main__':
-    start_service()
+    start_service(QUERY, users, groups)
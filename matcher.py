@@ -0,0 +1,105 @@
+import re
+
+
+class TextMatcher:
+    """
+    Поиск вхождений набора запросов в тексте за один проход.
+    Слова запроса при необходимости обрезаются до основы, запрос из нескольких слов ищется как фраза:
+    основы должны идти подряд, между ними допускаются только окончания и пропущенные короткие слова.
+    Все запросы компилируются в одно регулярное выражение без учета регистра и различия е/ё.
+    Вхождение должно начинаться с начала слова, окончание слова может быть любым
+    """
+
+    # Окончания, которые отбрасываются при обрезке слова до основы, длинные проверяются первыми
+    endings = sorted((
+        'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ых', 'их', 'ой', 'ей', 'ий', 'ый', 'ая', 'яя',
+        'ое', 'ее', 'ов', 'ев', 'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'ую', 'юю', 'а', 'я', 'о', 'е', 'ы', 'и',
+        'у', 'ю', 'ь', 'й'
+    ), key=len, reverse=True)
+
+    # Минимальная длина слова, которое обрезается до основы, и минимальная длина основы
+    min_word = 6
+    min_stem = 4
+
+    # Слова короче min_query_word (предлоги, союзы) в запросе из нескольких слов не ищутся
+    min_query_word = 3
+
+    def __init__(self, queries: list[str], window: int = 15, max_fragments: int = 1, stem: bool = True):
+        self.window = window
+        self.max_fragments = max_fragments
+        self.do_stem = stem
+        patterns = {self.query_pattern(query) for query in queries}
+        patterns.discard(None)
+        self.patterns = sorted(patterns, key=len, reverse=True)
+        self.regex = re.compile('(?<!\\w)(?:' + '|'.join(self.patterns) + ')', re.IGNORECASE) \
+            if self.patterns else None
+
+    def stem(self, word: str) -> str:
+        """
+        Отбрасывает окончание слова не короче min_word, если остается основа не короче min_stem
+        """
+        if len(word) < self.min_word:
+            return word
+        for ending in self.endings:
+            if word.endswith(ending) and len(word) - len(ending) >= self.min_stem:
+                return word[:-len(ending)]
+        return word
+
+    @staticmethod
+    def word_pattern(word: str) -> str:
+        return re.escape(word).replace('е', '[её]')
+
+    def query_pattern(self, query: str) -> str | None:
+        """
+        Возвращает регулярное выражение фразы запроса или None для пустого запроса.
+        Короткие слова пропускаются, если в запросе есть длинные, и допускаются на их месте в тексте.
+        Запрос только из коротких слов ищется целыми словами
+        """
+        words = re.findall(r'\w+', query.lower().replace('ё', 'е'))
+        if not words:
+            return None
+        if all(len(word) < self.min_query_word for word in words):
+            return r'\W+'.join(self.word_pattern(word) for word in words) + r'(?!\w)'
+        parts = []
+        skipped = 0
+        for word in words:
+            if len(word) < self.min_query_word:
+                skipped += 1
+                continue
+            if parts:
+                parts.append(r'\w*' + (rf'(?:\W+\w+){{0,{skipped}}}' if skipped else '') + r'\W+')
+            parts.append(self.word_pattern(self.stem(word) if self.do_stem else word))
+            skipped = 0
+        return ''.join(parts)
+
+    def find_all(self, text: str) -> list[tuple[int, int]]:
+        """
+        Возвращает позиции всех вхождений в виде (начало, конец)
+        """
+        if self.regex is None or not text:
+            return []
+        return [match.span() for match in self.regex.finditer(text)]
+
+    def windows(self, text: str, hits: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        """
+        Расширяет вхождения на window символов в обе стороны и объединяет пересекающиеся окна
+        """
+        result = []
+        for start, end in hits:
+            start = max(0, start - self.window)
+            end = min(len(text), end + self.window)
+            if result and start <= result[-1][1]:
+                result[-1] = (result[-1][0], max(result[-1][1], end))
+            else:
+                result.append((start, end))
+        return result
+
+    def fragment(self, text: str) -> str | None:
+        """
+        Возвращает фрагменты текста вокруг вхождений, не больше max_fragments, или None, если вхождений нет
+        """
+        hits = self.find_all(text)
+        if not hits:
+            return None
+        windows = self.windows(text, hits)[:self.max_fragments]
+        return ' ... '.join(text[start:end] for start, end in windows)
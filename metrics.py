@@ -0,0 +1,198 @@
+from bisect import bisect_left
+from multiprocessing import Array, Value
+
+
+class Counter:
+    """
+    Монотонный счетчик в разделяемой памяти
+    """
+
+    def __init__(self):
+        self._value = Value('d', 0.0)
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._value.get_lock():
+            self._value.value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value.value
+
+
+class Gauge:
+    """
+    Текущее значение в разделяемой памяти
+    """
+
+    def __init__(self):
+        self._value = Value('d', 0.0, lock=False)
+
+    def set(self, value: float) -> None:
+        self._value.value = value
+
+    @property
+    def value(self) -> float:
+        return self._value.value
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными границами корзин в разделяемой памяти.
+    Хранит количество наблюдений по корзинам, последняя корзина - +Inf, затем сумма и общее количество
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = tuple(buckets)
+        self._values = Array('d', len(self.buckets) + 3)
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._values.get_lock():
+            self._values[index] += 1
+            self._values[-2] += value
+            self._values[-1] += 1
+
+    @property
+    def sum(self) -> float:
+        return self._values[-2]
+
+    @property
+    def count(self) -> float:
+        return self._values[-1]
+
+    def samples(self, labels: dict) -> list[tuple]:
+        """
+        Возвращает строки гистограммы в виде (суффикс, метки, значение)
+        """
+        with self._values.get_lock():
+            values = self._values[:]
+        result = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), values):
+            cumulative += count
+            result.append(('_bucket', {**labels, 'le': str(bound)}, cumulative))
+        result.append(('_sum', labels, values[-2]))
+        result.append(('_count', labels, values[-1]))
+        return result
+
+
+class CrawlMetrics:
+    """
+    Метрики одного обхода, разделяемые между процессами обхода и API.
+    Набор меток фиксирован, так как разделяемая память выделяется при создании обхода
+    """
+
+    # Скрипты execute, для которых задержка учитывается отдельно, остальные попадают в execute
+    api_methods = ('wall.search', 'users.get,groups.getById', 'execute')
+
+    # Классы ошибок vk api, см. retry.classify_error
+    error_classes = ('http', 'server', 'auth', 'rate_limit', 'execute', 'owner', 'other')
+
+    # Индексы дедупликации
+    dedup_names = ('posts', 'photos', 'videos', 'post_queries')
+
+    # Создаваемые объекты
+    created_kinds = ('posts', 'photos', 'videos')
+
+    latency_buckets = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    batch_buckets = (1, 2, 5, 10, 15, 20, 25)
+    flush_buckets = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    rows_buckets = (10, 100, 500, 1000, 5000, 10000, 50000)
+    pool_buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+    def __init__(self):
+        self.api_latency = {method: Histogram(self.latency_buckets) for method in self.api_methods}
+        self.api_errors = {error_class: Counter() for error_class in self.error_classes}
+        self.api_retries = Counter()
+        self.execute_batch_size = Histogram(self.batch_buckets)
+        self.page_queue_depth = Gauge()
+        self.created = {kind: Counter() for kind in self.created_kinds}
+        self.db_flush_seconds = Histogram(self.flush_buckets)
+        self.db_flush_rows = Histogram(self.rows_buckets)
+        self.db_flush_errors = Counter()
+        self.db_pool_wait_seconds = Histogram(self.pool_buckets)
+        self.db_pool_timeouts = Counter()
+        self.dedup_size = {name: Gauge() for name in self.dedup_names}
+
+    def observe_api(self, method: str, latency: float) -> None:
+        """
+        Учитывает задержку одного вызова execute
+        """
+        self.api_latency.get(method, self.api_latency['execute']).observe(latency)
+
+    def observe_error(self, error_class: str) -> None:
+        self.api_errors.get(error_class, self.api_errors['other']).inc()
+
+    def observe_flush(self, seconds: float, rows: int) -> None:
+        """
+        Учитывает одну запись пачки в базу данных
+        """
+        self.db_flush_seconds.observe(seconds)
+        self.db_flush_rows.observe(rows)
+
+    def observe_pool_wait(self, seconds: float, timed_out: bool = False) -> None:
+        """
+        Учитывает получение соединения из пула подключения к базе данных
+        """
+        self.db_pool_wait_seconds.observe(seconds)
+        if timed_out:
+            self.db_pool_timeouts.inc()
+
+    def families(self, labels: dict) -> list[tuple]:
+        """
+        Возвращает метрики в виде (имя, тип, описание, строки)
+        """
+        return [
+            ('vk_api_request_seconds', 'histogram', 'Latency of VK API execute calls by script',
+             [sample for method, histogram in self.api_latency.items()
+              for sample in histogram.samples({**labels, 'method': method})]),
+            ('vk_api_errors_total', 'counter', 'VK API errors by class',
+             [('', {**labels, 'class': name}, counter.value) for name, counter in self.api_errors.items()]),
+            ('vk_api_retries_total', 'counter', 'VK API calls retried after an error',
+             [('', labels, self.api_retries.value)]),
+            ('vk_execute_batch_calls', 'histogram', 'API calls packed into one execute script',
+             self.execute_batch_size.samples(labels)),
+            ('vk_page_queue_depth', 'gauge', 'Pages waiting between parser and manager',
+             [('', labels, self.page_queue_depth.value)]),
+            ('vk_created_total', 'counter', 'Objects created by the parser',
+             [('', {**labels, 'kind': kind}, counter.value) for kind, counter in self.created.items()]),
+            ('vk_db_flush_seconds', 'histogram', 'Duration of one database batch write',
+             self.db_flush_seconds.samples(labels)),
+            ('vk_db_flush_rows', 'histogram', 'Rows written in one database batch',
+             self.db_flush_rows.samples(labels)),
+            ('vk_db_flush_errors_total', 'counter', 'Failed database batch writes',
+             [('', labels, self.db_flush_errors.value)]),
+            ('vk_db_pool_wait_seconds', 'histogram', 'Time to check out a database connection from the pool',
+             self.db_pool_wait_seconds.samples(labels)),
+            ('vk_db_pool_timeouts_total', 'counter', 'Database connection checkouts that timed out',
+             [('', labels, self.db_pool_timeouts.value)]),
+            ('vk_dedup_entries', 'gauge', 'Keys in dedup indexes',
+             [('', {**labels, 'index': name}, gauge.value) for name, gauge in self.dedup_size.items()]),
+        ]
+
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def render(items: list[tuple[dict, CrawlMetrics]]) -> str:
+    """
+    Возвращает метрики нескольких обходов в текстовом формате Prometheus
+    """
+    families = {}
+    for labels, metrics in items:
+        for name, _type, _help, samples in metrics.families(labels):
+            families.setdefault(name, (_type, _help, []))[2].extend(samples)
+    lines = []
+    for name, (_type, _help, samples) in families.items():
+        lines.append(f'# HELP {name} {_help}')
+        lines.append(f'# TYPE {name} {_type}')
+        for suffix, labels, value in samples:
+            lines.append(f'{name}{suffix}{format_labels(labels)} {float(value)!r}')
+    return '\n'.join(lines) + '\n'
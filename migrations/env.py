@@ -0,0 +1,38 @@
+"""
+Окружение миграций Alembic. Строка подключения берется из AppConfig, как у DataExecutor.
+
+Запуск: alembic upgrade head
+Для базы, созданной до миграций: alembic stamp 0001 && alembic upgrade head
+"""
+from alembic import context
+from sqlalchemy import create_engine
+
+from config import AppConfig
+from models import Base
+
+
+def run_migrations_offline() -> None:
+    """
+    Выводит SQL миграций без подключения к базе
+    """
+    context.configure(url=AppConfig.get_connection_string(), target_metadata=Base.metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """
+    Применяет миграции к базе
+    """
+    engine = create_engine(AppConfig.get_connection_string())
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=Base.metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,82 @@
+"""
+Схема до появления миграций: запросы, владельцы, посты и вложения постов
+
+Revision ID: 0001
+Revises:
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'tQueries',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('text', sa.String(), nullable=False)
+    )
+    op.create_table(
+        'tOwners',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('domain', sa.String(), nullable=False),
+        sa.Column('type', sa.String(), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('first_name', sa.String(), nullable=True),
+        sa.Column('last_name', sa.String(), nullable=True),
+        sa.Column('is_closed', sa.Boolean(), nullable=False)
+    )
+    op.create_table(
+        'tPosts',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('type', sa.String(), nullable=True),
+        sa.Column('date', sa.DateTime(), nullable=False),
+        sa.Column('from_id', sa.Integer(), nullable=False),
+        sa.Column('views_cnt', sa.Integer(), nullable=True),
+        sa.Column('likes_cnt', sa.Integer(), nullable=True),
+        sa.Column('comments_cnt', sa.Integer(), nullable=True),
+        sa.Column('reposts_cnt', sa.Integer(), nullable=True),
+        sa.Column('text', sa.String(), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('query_id', sa.Integer(), sa.ForeignKey('tQueries.id'), nullable=False),
+        sa.Column('owner_id', sa.Integer(), sa.ForeignKey('tOwners.id'), nullable=False)
+    )
+    op.create_table(
+        'tLinks',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('caption', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('post_id', sa.Integer(), sa.ForeignKey('tPosts.id'), nullable=False)
+    )
+    op.create_table(
+        'tPhotos',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('date', sa.DateTime(), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('text', sa.String(), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('post_id', sa.Integer(), sa.ForeignKey('tPosts.id'), nullable=False)
+    )
+    op.create_table(
+        'tVideos',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('date', sa.DateTime(), nullable=False),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('views_cnt', sa.Integer(), nullable=True),
+        sa.Column('comments_cnt', sa.Integer(), nullable=True),
+        sa.Column('duration', sa.Integer(), nullable=True),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('post_id', sa.Integer(), sa.ForeignKey('tPosts.id'), nullable=False)
+    )
+
+
+def downgrade() -> None:
+    for table in ('tVideos', 'tPhotos', 'tLinks', 'tPosts', 'tOwners', 'tQueries'):
+        op.drop_table(table)
@@ -0,0 +1,65 @@
+"""
+Таблицы связей постов с запросами, отметок и контрольных точек обхода и полных текстов постов
+
+Revision ID: 0002
+Revises: 0001
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from config import AppConfig
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'tPostQueries',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('query_id', sa.Integer(), sa.ForeignKey('tQueries.id'), nullable=False),
+        sa.UniqueConstraint('post_id', 'query_id')
+    )
+    op.create_index('ix_tPostQueries_post_id', 'tPostQueries', ['post_id'])
+    op.create_table(
+        'tCrawlMarks',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('query_id', sa.Integer(), sa.ForeignKey('tQueries.id'), nullable=False),
+        sa.Column('last_date', sa.DateTime(), nullable=False),
+        sa.Column('last_post_id', sa.Integer(), nullable=False),
+        sa.UniqueConstraint('owner_id', 'query_id')
+    )
+    op.create_table(
+        'tCrawlCheckpoints',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('job_id', sa.String(), nullable=False, unique=True),
+        sa.Column('params', sa.String(), nullable=False),
+        sa.Column('state', sa.String(), nullable=False),
+        sa.Column('updated', sa.DateTime(), nullable=False)
+    )
+    op.create_table(
+        'tPostTexts',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('text', sa.String(), nullable=False),
+        sa.UniqueConstraint('owner_id', 'post_id')
+    )
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            f'ALTER TABLE "tPostTexts" ADD COLUMN tsv tsvector '
+            f"GENERATED ALWAYS AS (to_tsvector('{AppConfig.get_full_text_language()}', text)) STORED"
+        )
+        op.execute('CREATE INDEX "ix_tPostTexts_tsv" ON "tPostTexts" USING gin (tsv)')
+        if AppConfig.get_full_text_compression():
+            op.execute(f'ALTER TABLE "tPostTexts" ALTER COLUMN text '
+                       f'SET COMPRESSION {AppConfig.get_full_text_compression()}')
+
+
+def downgrade() -> None:
+    for table in ('tPostTexts', 'tCrawlCheckpoints', 'tCrawlMarks', 'tPostQueries'):
+        op.drop_table(table)
@@ -0,0 +1,38 @@
+"""
+Индексы для загрузки индексов дедупликации, выборок по запросу и дате и соединений с постами
+
+Revision ID: 0003
+Revises: 0002
+"""
+from alembic import op
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# Имя индекса, таблица и колонки
+indexes = [
+    ('ix_tPosts_owner_id_id', 'tPosts', ['owner_id', 'id']),
+    ('ix_tPosts_query_id_date', 'tPosts', ['query_id', 'date']),
+    ('ix_tPosts_date', 'tPosts', ['date']),
+    ('ix_tLinks_post_id', 'tLinks', ['post_id']),
+    ('ix_tPhotos_owner_id_id', 'tPhotos', ['owner_id', 'id']),
+    ('ix_tPhotos_post_id', 'tPhotos', ['post_id']),
+    ('ix_tVideos_owner_id_id', 'tVideos', ['owner_id', 'id']),
+    ('ix_tVideos_post_id', 'tVideos', ['post_id']),
+    ('ix_tPostQueries_query_id_post_id', 'tPostQueries', ['query_id', 'post_id'])
+]
+
+
+def upgrade() -> None:
+    # В PostgreSQL индексы строятся без блокировки записи, CONCURRENTLY не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns in indexes:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(indexes):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,106 @@
+"""
+Секционирование tPosts по месяцам даты поста
+
+Первичный ключ секционированной таблицы должен включать ключ секционирования, поэтому он становится (id, date),
+а внешние ключи tLinks, tPhotos и tVideos на tPosts.id удаляются. Существующие посты копируются в секции,
+на большой таблице миграция выполняется долго и требует места под вторую копию tPosts.
+Секции на будущие месяцы создает DataExecutor.ensure_post_partitions, посты с датой вне созданных секций
+попадают в tPosts_default.
+В других СУБД секционирование пропускается: ключ и внешние ключи меняются так же, таблица остается обычной.
+
+Revision ID: 0004
+Revises: 0003
+"""
+from datetime import datetime
+
+from alembic import op
+
+from config import AppConfig
+from partitions import create_post_partitions, default_partition, month_start
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# Таблицы со ссылками на tPosts.id
+child_tables = ('tLinks', 'tPhotos', 'tVideos')
+
+# Имя безымянного внешнего ключа SQLite при пересоздании таблицы совпадает с именем в PostgreSQL
+naming_convention = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+post_columns = ('id, type, date, from_id, views_cnt, likes_cnt, comments_cnt, reposts_cnt, text, url, '
+                'query_id, owner_id')
+
+
+def create_posts_table(name: str, primary_key: str, partitioned: bool) -> None:
+    op.execute(f'''
+        CREATE TABLE "{name}" (
+            id INTEGER NOT NULL,
+            type VARCHAR,
+            date TIMESTAMP NOT NULL,
+            from_id INTEGER NOT NULL,
+            views_cnt INTEGER,
+            likes_cnt INTEGER,
+            comments_cnt INTEGER,
+            reposts_cnt INTEGER,
+            text VARCHAR NOT NULL,
+            url VARCHAR NOT NULL,
+            query_id INTEGER NOT NULL REFERENCES "tQueries" (id),
+            owner_id INTEGER NOT NULL REFERENCES "tOwners" (id),
+            CONSTRAINT "{name}_pkey" PRIMARY KEY ({primary_key})
+        ){' PARTITION BY RANGE (date)' if partitioned else ''}
+    ''')
+
+
+def create_posts_indexes() -> None:
+    op.execute('CREATE INDEX "ix_tPosts_owner_id_id" ON "tPosts" (owner_id, id)')
+    op.execute('CREATE INDEX "ix_tPosts_query_id_date" ON "tPosts" (query_id, date)')
+    op.execute('CREATE INDEX "ix_tPosts_date" ON "tPosts" (date)')
+
+
+def replace_posts_table(primary_key: str, partitioned: bool) -> None:
+    """
+    Создает новую tPosts, переносит в нее посты и удаляет старую таблицу
+    """
+    connection = op.get_bind()
+    op.execute('ALTER TABLE "tPosts" RENAME TO "tPosts_old"')
+    if connection.dialect.name == 'postgresql':
+        op.execute('ALTER TABLE "tPosts_old" RENAME CONSTRAINT "tPosts_pkey" TO "tPosts_old_pkey"')
+    for name in ('ix_tPosts_owner_id_id', 'ix_tPosts_query_id_date', 'ix_tPosts_date'):
+        op.execute(f'DROP INDEX IF EXISTS "{name}"')
+    create_posts_table('tPosts', primary_key, partitioned)
+    if partitioned:
+        first_date = connection.exec_driver_sql('SELECT min(date) FROM "tPosts_old"').scalar()
+        now = datetime.utcnow()
+        create_post_partitions(connection, month_start(first_date or now),
+                               month_start(now, AppConfig.get_posts_partition_ahead()))
+        op.execute(f'CREATE TABLE "{default_partition}" PARTITION OF "tPosts" DEFAULT')
+    create_posts_indexes()
+    op.execute(f'INSERT INTO "tPosts" ({post_columns}) SELECT {post_columns} FROM "tPosts_old"')
+    op.execute('DROP TABLE "tPosts_old"')
+
+
+def upgrade() -> None:
+    # Внешние ключи удаляются до переименования tPosts: SQLite переносит их на переименованную таблицу
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in child_tables:
+            op.execute(f'ALTER TABLE "{table}" DROP CONSTRAINT IF EXISTS "{table}_post_id_fkey"')
+        replace_posts_table('id, date', partitioned=True)
+        return
+    for table in child_tables:
+        with op.batch_alter_table(table, naming_convention=naming_convention) as batch:
+            batch.drop_constraint(f'{table}_post_id_fkey', type_='foreignkey')
+    replace_posts_table('id, date', partitioned=False)
+
+
+def downgrade() -> None:
+    replace_posts_table('id', partitioned=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in child_tables:
+            op.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_post_id_fkey" '
+                       f'FOREIGN KEY (post_id) REFERENCES "tPosts" (id)')
+        return
+    for table in child_tables:
+        with op.batch_alter_table(table, naming_convention=naming_convention) as batch:
+            batch.create_foreign_key(f'{table}_post_id_fkey', 'tPosts', ['post_id'], ['id'])
@@ -0,0 +1,87 @@
+"""
+Ключи постов, фотографий и видео с владельцем
+
+id постов, фотографий и видео уникальны только в пределах стены, поэтому первичные ключи становятся
+(owner_id, id), у секционированной tPosts - (owner_id, id, date). tLinks, tPhotos и tVideos ссылаются на пост
+по (post_owner_id, post_id), tPostQueries - по (owner_id, post_id). Колонки заполняются по tPosts,
+строки, пост которых не найден, удаляются: связать их с постом нельзя.
+В SQLite ключи меняются пересозданием таблиц (batch-режим Alembic).
+
+Revision ID: 0005
+Revises: 0004
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# Таблицы со ссылками на посты и колонка владельца поста в них
+post_refs = (('tLinks', 'post_owner_id'), ('tPhotos', 'post_owner_id'), ('tVideos', 'post_owner_id'),
+             ('tPostQueries', 'owner_id'))
+
+# Имена безымянных ограничений SQLite при пересоздании таблиц совпадают с именами в PostgreSQL
+naming_convention = {
+    'pk': '%(table_name)s_pkey',
+    'fk': '%(table_name)s_%(column_0_name)s_fkey',
+    'uq': '%(table_name)s_%(column_0_N_name)s_key'
+}
+
+
+def posts_key(connection, columns: list[str]) -> list[str]:
+    """
+    Добавляет к ключу tPosts дату, если она входит в текущий ключ (секционированная таблица после 0004)
+    """
+    if 'date' in sa.inspect(connection).get_pk_constraint('tPosts')['constrained_columns']:
+        return columns + ['date']
+    return columns
+
+
+def replace_primary_key(table: str, columns: list[str], drop_id_default: bool = False) -> None:
+    with op.batch_alter_table(table, naming_convention=naming_convention) as batch:
+        batch.drop_constraint(f'{table}_pkey', type_='primary')
+        batch.create_primary_key(f'{table}_pkey', columns)
+        if drop_id_default:
+            batch.alter_column('id', existing_type=sa.Integer(), server_default=None)
+
+
+def replace_unique(table: str, old_columns: list[str], new_columns: list[str]) -> None:
+    with op.batch_alter_table(table, naming_convention=naming_convention) as batch:
+        batch.drop_constraint(f'{table}_{"_".join(old_columns)}_key', type_='unique')
+        batch.create_unique_constraint(f'{table}_{"_".join(new_columns)}_key', new_columns)
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    for table, column in post_refs:
+        op.add_column(table, sa.Column(column, sa.Integer(), nullable=True))
+        op.execute(f'UPDATE "{table}" AS t SET {column} = p.owner_id FROM "tPosts" AS p WHERE p.id = t.post_id')
+        op.execute(f'DELETE FROM "{table}" WHERE {column} IS NULL')
+        with op.batch_alter_table(table, naming_convention=naming_convention) as batch:
+            batch.alter_column(column, existing_type=sa.Integer(), nullable=False)
+    # Ключи начинаются с (owner_id, id), отдельные индексы по этим колонкам больше не нужны
+    for name in ('ix_tPosts_owner_id_id', 'ix_tPhotos_owner_id_id', 'ix_tVideos_owner_id_id',
+                 'ix_tPostQueries_query_id_post_id'):
+        op.execute(f'DROP INDEX IF EXISTS "{name}"')
+    replace_primary_key('tPosts', posts_key(connection, ['owner_id', 'id']))
+    for table in ('tPhotos', 'tVideos'):
+        replace_primary_key(table, ['owner_id', 'id'], drop_id_default=True)
+    replace_unique('tPostQueries', ['post_id', 'query_id'], ['owner_id', 'post_id', 'query_id'])
+    op.create_index('ix_tPostQueries_query_id_owner_id_post_id', 'tPostQueries', ['query_id', 'owner_id', 'post_id'])
+
+
+def downgrade() -> None:
+    connection = op.get_bind()
+    op.drop_index('ix_tPostQueries_query_id_owner_id_post_id', table_name='tPostQueries', if_exists=True)
+    replace_unique('tPostQueries', ['owner_id', 'post_id', 'query_id'], ['post_id', 'query_id'])
+    op.create_index('ix_tPostQueries_query_id_post_id', 'tPostQueries', ['query_id', 'post_id'])
+    replace_primary_key('tPosts', posts_key(connection, ['id']))
+    op.create_index('ix_tPosts_owner_id_id', 'tPosts', ['owner_id', 'id'])
+    for table in ('tPhotos', 'tVideos'):
+        replace_primary_key(table, ['id'])
+        op.create_index(f'ix_{table}_owner_id_id', table, ['owner_id', 'id'])
+    for table, column in post_refs:
+        with op.batch_alter_table(table, naming_convention=naming_convention) as batch:
+            batch.drop_column(column)
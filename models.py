@@ -1,8 +1,10 @@
 from datetime import datetime
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import DDL, ForeignKey, Index, PrimaryKeyConstraint, UniqueConstraint, event
 from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase, Mapped, mapped_column, relationship
 
+from config import AppConfig
+
 
 class Base(DeclarativeBase):
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -32,8 +34,17 @@ class Owner(Base):
         return f'Group:{self.id}:{self.name}'
 
 
+# id постов, фотографий и видео уникальны только в пределах стены владельца, поэтому ключи включают owner_id
+# (миграция 0005). Первичный ключ tPosts включает и дату, ключ секционирования (миграция 0004),
+# поэтому вложения ссылаются на посты по (post_owner_id, post_id) без внешнего ключа
 class Post(Base):
     __tablename__ = 'tPosts'
+    __table_args__ = (
+        PrimaryKeyConstraint('owner_id', 'id', 'date'),
+        Index('ix_tPosts_query_id_date', 'query_id', 'date'),
+        Index('ix_tPosts_date', 'date')
+    )
+    id: Mapped[int] = mapped_column(autoincrement=False)
     type: Mapped[str | None]
     date: Mapped[datetime]
     from_id: Mapped[int]
@@ -47,9 +58,18 @@ class Post(Base):
     query_id: Mapped[int] = mapped_column(ForeignKey('tQueries.id'))
     owner: Mapped['Owner'] = relationship(back_populates='posts', uselist=False)
     owner_id: Mapped[int] = mapped_column(ForeignKey('tOwners.id'))
-    links: Mapped[list['Link']] = relationship(back_populates='post', uselist=True)
-    photos: Mapped[list['Photo']] = relationship(back_populates='post', uselist=True)
-    videos: Mapped[list['Video']] = relationship(back_populates='post', uselist=True)
+    links: Mapped[list['Link']] = relationship(
+        back_populates='post', uselist=True,
+        primaryjoin='and_(Post.owner_id == foreign(Link.post_owner_id), Post.id == foreign(Link.post_id))'
+    )
+    photos: Mapped[list['Photo']] = relationship(
+        back_populates='post', uselist=True,
+        primaryjoin='and_(Post.owner_id == foreign(Photo.post_owner_id), Post.id == foreign(Photo.post_id))'
+    )
+    videos: Mapped[list['Video']] = relationship(
+        back_populates='post', uselist=True,
+        primaryjoin='and_(Post.owner_id == foreign(Video.post_owner_id), Post.id == foreign(Video.post_id))'
+    )
 
     def __repr__(self) -> str:
         return f'Post:{self.id}:From_{self.from_id}:Date_{self.date}'
@@ -61,22 +81,34 @@ class Link(Base):
     url: Mapped[str]
     caption: Mapped[str | None]
     description: Mapped[str | None]
-    post: Mapped['Post'] = relationship(back_populates='links', uselist=False)
-    post_id: Mapped[int] = mapped_column(ForeignKey('tPosts.id'))
+    post: Mapped['Post'] = relationship(
+        back_populates='links', uselist=False,
+        primaryjoin='and_(Post.owner_id == foreign(Link.post_owner_id), Post.id == foreign(Link.post_id))'
+    )
+    post_owner_id: Mapped[int]
+    post_id: Mapped[int] = mapped_column(index=True)
 
 
 class Photo(Base):
     __tablename__ = 'tPhotos'
+    __table_args__ = (PrimaryKeyConstraint('owner_id', 'id'),)
+    id: Mapped[int] = mapped_column(autoincrement=False)
     date: Mapped[datetime]
     url: Mapped[str]
     text: Mapped[str]
     owner_id: Mapped[int]
-    post: Mapped['Post'] = relationship(back_populates='photos', uselist=False)
-    post_id: Mapped[int] = mapped_column(ForeignKey('tPosts.id'))
+    post: Mapped['Post'] = relationship(
+        back_populates='photos', uselist=False,
+        primaryjoin='and_(Post.owner_id == foreign(Photo.post_owner_id), Post.id == foreign(Photo.post_id))'
+    )
+    post_owner_id: Mapped[int]
+    post_id: Mapped[int] = mapped_column(index=True)
 
 
 class Video(Base):
     __tablename__ = 'tVideos'
+    __table_args__ = (PrimaryKeyConstraint('owner_id', 'id'),)
+    id: Mapped[int] = mapped_column(autoincrement=False)
     date: Mapped[datetime]
     title: Mapped[str]
     description: Mapped[str | None]
@@ -84,5 +116,65 @@ class Video(Base):
     comments_cnt: Mapped[int | None]
     duration: Mapped[int | None]
     owner_id: Mapped[int]
-    post: Mapped['Post'] = relationship(back_populates='videos', uselist=False)
-    post_id: Mapped[int] = mapped_column(ForeignKey('tPosts.id'))
+    post: Mapped['Post'] = relationship(
+        back_populates='videos', uselist=False,
+        primaryjoin='and_(Post.owner_id == foreign(Video.post_owner_id), Post.id == foreign(Video.post_id))'
+    )
+    post_owner_id: Mapped[int]
+    post_id: Mapped[int] = mapped_column(index=True)
+
+
+class PostQuery(Base):
+    __tablename__ = 'tPostQueries'
+    __table_args__ = (
+        UniqueConstraint('owner_id', 'post_id', 'query_id'),
+        Index('ix_tPostQueries_query_id_owner_id_post_id', 'query_id', 'owner_id', 'post_id')
+    )
+    owner_id: Mapped[int]
+    post_id: Mapped[int] = mapped_column(index=True)
+    query_id: Mapped[int] = mapped_column(ForeignKey('tQueries.id'))
+
+
+class CrawlMark(Base):
+    __tablename__ = 'tCrawlMarks'
+    __table_args__ = (UniqueConstraint('owner_id', 'query_id'),)
+    owner_id: Mapped[int]
+    query_id: Mapped[int] = mapped_column(ForeignKey('tQueries.id'))
+    last_date: Mapped[datetime]
+    last_post_id: Mapped[int]
+
+    def __repr__(self) -> str:
+        return f'CrawlMark:{self.owner_id}:Query_{self.query_id}:Date_{self.last_date}'
+
+
+class CrawlCheckpoint(Base):
+    __tablename__ = 'tCrawlCheckpoints'
+    job_id: Mapped[str] = mapped_column(unique=True)
+    params: Mapped[str]
+    state: Mapped[str]
+    updated: Mapped[datetime]
+
+    def __repr__(self) -> str:
+        return f'CrawlCheckpoint:{self.job_id}:Updated_{self.updated}'
+
+
+class PostText(Base):
+    __tablename__ = 'tPostTexts'
+    __table_args__ = (UniqueConstraint('owner_id', 'post_id'),)
+    owner_id: Mapped[int]
+    post_id: Mapped[int]
+    text: Mapped[str]
+
+    def __repr__(self) -> str:
+        return f'PostText:{self.owner_id}_{self.post_id}'
+
+
+# В PostgreSQL полный текст индексируется вычисляемой колонкой tsv с индексом GIN,
+# при FULL_TEXT_COMPRESSION текст сжимается указанным методом (lz4 требует PostgreSQL 14+)
+event.listen(PostText.__table__, 'after_create', DDL(
+    f'ALTER TABLE "tPostTexts" ADD COLUMN tsv tsvector '
+    f"GENERATED ALWAYS AS (to_tsvector('{AppConfig.get_full_text_language()}', text)) STORED; "
+    f'CREATE INDEX "ix_tPostTexts_tsv" ON "tPostTexts" USING gin (tsv)'
+    + (f'; ALTER TABLE "tPostTexts" ALTER COLUMN text SET COMPRESSION {AppConfig.get_full_text_compression()}'
+       if AppConfig.get_full_text_compression() else '')
+).execute_if(dialect='postgresql'))
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+
+# Секционированная таблица постов и ее секция по умолчанию для дат вне созданных диапазонов
+posts_table = 'tPosts'
+default_partition = 'tPosts_default'
+
+
+def month_start(value: datetime, shift: int = 0) -> datetime:
+    """
+    Возвращает начало месяца даты, сдвинутого на shift месяцев
+    """
+    month = value.year * 12 + value.month - 1 + shift
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+def partition_name(start: datetime) -> str:
+    return f'{posts_table}_{start:%Y_%m}'
+
+
+def is_partitioned(connection, table: str = posts_table) -> bool:
+    """
+    Проверяет, что таблица в PostgreSQL секционирована
+    """
+    if connection.dialect.name != 'postgresql':
+        return False
+    query = text('SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :name')
+    return connection.execute(query, {'name': table}).first() is not None
+
+
+def create_post_partitions(connection, start: datetime, end: datetime) -> list[str]:
+    """
+    Создает месячные секции tPosts с месяца start по месяц end включительно.
+    Возвращает имена секций, существующие секции пропускаются
+    """
+    names = []
+    current = month_start(start)
+    while current <= end:
+        upper = month_start(current, 1)
+        name = partition_name(current)
+        connection.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{posts_table}" '
+            f"FOR VALUES FROM ('{current:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+        ))
+        names.append(name)
+        current = upper
+    return names
+
+
+def ensure_post_partitions(connection, months_ahead: int) -> list[str]:
+    """
+    Создает секции tPosts от текущего месяца на months_ahead месяцев вперед, если таблица секционирована
+    """
+    if not is_partitioned(connection):
+        return []
+    now = datetime.utcnow()
+    return create_post_partitions(connection, month_start(now), month_start(now, months_ahead))
@@ -0,0 +1,48 @@
+class BatchPlanner:
+    """
+    Раскладывает вызовы wall.search по скриптам execute.
+    В скрипте не больше max_calls вызовов, а ожидаемый размер ответа не превышает max_response_size.
+    Размер ответа вызова оценивается по ожидаемому количеству постов на следующей странице курсора
+    """
+
+    # Оценка размера ответа wall.search без постов, байт
+    call_overhead = 200
+
+    def __init__(self, max_calls: int, max_response_size: int, post_size: int):
+        self.max_calls = max_calls
+        self.max_response_size = max_response_size
+        self.post_size = post_size
+
+    @staticmethod
+    def expected_posts(cursor, count: int) -> int:
+        """
+        Возвращает ожидаемое количество постов на следующей странице курсора
+        """
+        if cursor.total_cnt is None:
+            return count
+        return max(0, min(count, cursor.total_cnt - cursor.offset))
+
+    def estimate(self, cursor, count: int) -> int:
+        """
+        Возвращает ожидаемый размер ответа wall.search для курсора
+        """
+        return self.call_overhead + self.expected_posts(cursor, count) * self.post_size
+
+    def plan(self, cursors: list, count: int) -> list[list]:
+        """
+        Упаковывает курсоры в пачки методом first fit decreasing
+        """
+        sized_cursors = sorted(((self.estimate(cursor, count), cursor) for cursor in cursors),
+                               key=lambda item: item[0], reverse=True)
+        batches = []
+        sizes = []
+        for size, cursor in sized_cursors:
+            for i, batch in enumerate(batches):
+                if len(batch) < self.max_calls and sizes[i] + size <= self.max_response_size:
+                    batch.append(cursor)
+                    sizes[i] += size
+                    break
+            else:
+                batches.append([cursor])
+                sizes.append(size)
+        return batches
@@ -0,0 +1,167 @@
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from typing import ClassVar
+
+from models import Base, Owner, Post, Link, Photo, Video, PostQuery, PostText
+
+
+@dataclass(slots=True)
+class OwnerRecord:
+    """
+    Строка tOwners
+    """
+    model: ClassVar = Owner
+    id: int
+    domain: str
+    type: str
+    url: str
+    name: str | None
+    first_name: str | None
+    last_name: str | None
+    is_closed: bool
+
+
+@dataclass(slots=True)
+class LinkRecord:
+    """
+    Строка tLinks без post_owner_id и post_id, пост задается владельцем записи
+    """
+    model: ClassVar = Link
+    title: str
+    url: str
+    caption: str | None
+    description: str | None
+
+
+@dataclass(slots=True)
+class PhotoRecord:
+    """
+    Строка tPhotos без post_owner_id и post_id
+    """
+    model: ClassVar = Photo
+    id: int
+    date: datetime
+    url: str
+    text: str
+    owner_id: int
+
+
+@dataclass(slots=True)
+class VideoRecord:
+    """
+    Строка tVideos без post_owner_id и post_id
+    """
+    model: ClassVar = Video
+    id: int
+    date: datetime
+    title: str
+    description: str | None
+    views_cnt: int | None
+    comments_cnt: int | None
+    duration: int | None
+    owner_id: int
+
+
+@dataclass(slots=True)
+class PostRecord:
+    """
+    Строка tPosts вместе с вложениями, full_text - полный текст поста для tPostTexts
+    """
+    model: ClassVar = Post
+    id: int
+    query_id: int
+    type: str | None
+    date: datetime
+    from_id: int
+    views_cnt: int | None
+    likes_cnt: int | None
+    comments_cnt: int | None
+    reposts_cnt: int | None
+    text: str
+    owner_id: int
+    url: str
+    links: list[LinkRecord] = field(default_factory=list)
+    photos: list[PhotoRecord] = field(default_factory=list)
+    videos: list[VideoRecord] = field(default_factory=list)
+    full_text: str | None = None
+
+
+@dataclass(slots=True)
+class PostQueryRecord:
+    """
+    Строка tPostQueries
+    """
+    model: ClassVar = PostQuery
+    owner_id: int
+    post_id: int
+    query_id: int
+
+
+# Поля записей, которые соответствуют связям модели, а не колонкам
+relation_fields = ('links', 'photos', 'videos')
+
+# Поля записей, которые пишутся в отдельные таблицы
+side_fields = ('full_text',)
+
+
+def to_model(record):
+    """
+    Создает объект модели по записи. Объекты моделей возвращаются без изменений
+    """
+    if isinstance(record, Base):
+        return record
+    obj = record.model(**{
+        item.name: getattr(record, item.name) for item in fields(record)
+        if item.name not in relation_fields and item.name not in side_fields
+    })
+    for name in relation_fields:
+        children = getattr(record, name, None)
+        if children:
+            getattr(obj, name).extend(to_model(child) for child in children)
+    return obj
+
+
+def to_text_model(record) -> PostText | None:
+    """
+    Создает объект полного текста поста, если текст сохранен в записи
+    """
+    full_text = getattr(record, 'full_text', None)
+    if not full_text:
+        return None
+    return PostText(owner_id=record.owner_id, post_id=record.id, text=full_text)
+
+
+# Типы записей связей для восстановления из контрольной точки
+relation_records = {'links': LinkRecord, 'photos': PhotoRecord, 'videos': VideoRecord}
+
+
+def to_state(record) -> dict:
+    """
+    Возвращает запись словарем для контрольной точки, даты - строками ISO
+    """
+    state = {}
+    for item in fields(record):
+        value = getattr(record, item.name)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif item.name in relation_records:
+            value = [to_state(child) for child in value]
+        state[item.name] = value
+    return state
+
+
+def from_state(record_type, state: dict):
+    """
+    Создает запись из словаря контрольной точки
+    """
+    values = {}
+    for item in fields(record_type):
+        if item.name not in state:
+            continue
+        value = state[item.name]
+        if item.type is datetime and value is not None:
+            value = datetime.fromisoformat(value)
+        elif item.name in relation_records:
+            value = [from_state(relation_records[item.name], child) for child in value]
+        values[item.name] = value
+    return record_type(**values)
@@ -0,0 +1,72 @@
+from typing import Iterator
+
+
+class OwnerRegistry:
+    """
+    Владельцы обхода с доступом по id и короткому имени.
+    Реестр сам ведет множество активных владельцев и список владельцев, еще не переданных на запись
+    """
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_domain = {}
+        self._active = {}
+        self._unexported = []
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator:
+        return iter(self._by_id.values())
+
+    def __contains__(self, owner_id: int) -> bool:
+        return owner_id in self._by_id
+
+    def has_key(self, key, is_group: bool = False) -> bool:
+        """
+        Проверяет владельца по id или короткому имени в том виде, в котором его передают в users.get и groups.getById
+        """
+        key = str(key)
+        if key.isdigit():
+            return (-int(key) if is_group else int(key)) in self._by_id
+        return key.lower() in self._by_domain
+
+    @property
+    def active_cnt(self) -> int:
+        return len(self._active)
+
+    def active(self) -> list:
+        """
+        Возвращает активных владельцев в порядке добавления
+        """
+        return list(self._active.values())
+
+    def add(self, owner, exported: bool = False) -> bool:
+        """
+        Добавляет владельца, возвращает False, если владелец с таким id уже есть.
+        exported - владелец уже сохранен в базе
+        """
+        if owner.id in self._by_id:
+            return False
+        self._by_id[owner.id] = owner
+        if owner.domain:
+            self._by_domain[owner.domain.lower()] = owner
+        if owner.is_active:
+            self._active[owner.id] = owner
+        if not exported:
+            self._unexported.append(owner)
+        return True
+
+    def deactivate(self, owner) -> bool:
+        """
+        Деактивирует владельца, возвращает False, если он уже был неактивен
+        """
+        owner.is_active = False
+        return self._active.pop(owner.id, None) is not None
+
+    def pop_unexported(self) -> list:
+        """
+        Возвращает владельцев, добавленных после предыдущего вызова и еще не сохраненных
+        """
+        owners, self._unexported = self._unexported, []
+        return owners
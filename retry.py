@@ -0,0 +1,154 @@
+import random
+import time
+from collections import defaultdict
+
+from vk_api.exceptions import ApiError, ApiHttpError
+
+from metrics import CrawlMetrics
+
+
+# Действия после ошибки запроса
+RETRY = 'retry'
+SPLIT = 'split'
+FAIL = 'fail'
+
+# Классы ошибок vk api по кодам
+ERROR_CLASSES = {
+    1: 'server',
+    5: 'auth',
+    6: 'rate_limit',
+    9: 'rate_limit',
+    10: 'server',
+    13: 'execute',
+    15: 'owner',
+    18: 'owner',
+    28: 'auth',
+    29: 'rate_limit',
+    30: 'owner',
+    100: 'owner',
+    113: 'owner',
+    203: 'owner'
+}
+
+
+def classify_error(error: Exception) -> str:
+    """
+    Возвращает класс ошибки запроса к vk api
+    """
+    if isinstance(error, ApiHttpError):
+        return 'http'
+    if isinstance(error, ApiError):
+        return ERROR_CLASSES.get(error.code, 'execute')
+    return 'other'
+
+
+class CircuitBreaker:
+    """
+    Размыкается после серии ошибок одного класса и не пропускает запросы заданное время
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.threshold and self.opened_at is None:
+            self.opened_at = time.monotonic()
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def remaining(self) -> float:
+        """
+        Возвращает время до полуоткрытого состояния, 0 - если запросы разрешены
+        """
+        if self.opened_at is None:
+            return 0.0
+        remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+        if remaining <= 0:
+            self.opened_at = None
+            self.failures = self.threshold - 1
+            return 0.0
+        return remaining
+
+
+class RetryStats:
+    """
+    Счетчики повторов и времени, потерянного на ожидание
+    """
+
+    def __init__(self):
+        self.errors_cnt = defaultdict(int)
+        self.retries_cnt = 0
+        self.failed_cnt = 0
+        self.retry_time = 0.0
+
+    def report(self) -> str:
+        errors = ', '.join(f'{name}: {cnt}' for name, cnt in sorted(self.errors_cnt.items())) or 'none'
+        return (f'Retries: {self.retries_cnt}, failed: {self.failed_cnt}, '
+                f'time lost: {self.retry_time:.1f} s, errors by class: {errors}')
+
+
+class RetryController:
+    """
+    Решает, что делать с ошибкой запроса: повторить после паузы, разбить пачку или отказаться.
+    Лимиты ждут, ошибки авторизации повторяются сразу на другом ключе,
+    ошибки отдельных владельцев и скрипта execute разбивают пачку
+    """
+
+    def __init__(self, max_attempts: int, base_delay: float, max_delay: float,
+                 breaker_threshold: int, breaker_timeout: float, metrics: CrawlMetrics = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breakers = defaultdict(lambda: CircuitBreaker(breaker_threshold, breaker_timeout))
+        self.stats = RetryStats()
+        self.metrics = metrics
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Экспоненциальная задержка с полным джиттером
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def on_success(self, error: Exception = None) -> None:
+        """
+        Закрывает прерыватель класса ошибки error, после которой запрос был успешно повторен.
+        Успех запроса не говорит о восстановлении после ошибок других классов, их прерыватели не меняются
+        """
+        if error is not None:
+            self.breakers[classify_error(error)].record_success()
+
+    def wait_time(self) -> float:
+        """
+        Возвращает время, на которое разомкнутые прерыватели приостанавливают отправку новых запросов
+        """
+        return max((breaker.remaining() for breaker in list(self.breakers.values())), default=0.0)
+
+    def decide(self, error: Exception, attempt: int) -> tuple[str, float]:
+        """
+        Возвращает действие и задержку перед повтором
+        """
+        error_class = classify_error(error)
+        self.stats.errors_cnt[error_class] += 1
+        if self.metrics is not None:
+            self.metrics.observe_error(error_class)
+        if error_class in ('owner', 'execute'):
+            return SPLIT, 0.0
+        if error_class == 'other' or attempt >= self.max_attempts:
+            self.stats.failed_cnt += 1
+            return FAIL, 0.0
+        self.stats.retries_cnt += 1
+        if self.metrics is not None:
+            self.metrics.api_retries.inc()
+        if error_class == 'auth':
+            return RETRY, 0.0
+        breaker = self.breakers[error_class]
+        breaker.record_failure()
+        delay = max(self.backoff(attempt), breaker.remaining())
+        self.stats.retry_time += delay
+        return RETRY, delay
@@ -0,0 +1,137 @@
+import time
+from multiprocessing import Process, Queue, current_process
+from queue import Empty
+from multiprocessing.managers import BaseManager
+
+from config import AppConfig
+from dedup import DedupIndex
+from executors import DataExecutor
+from jobs import JobProgress
+from logger import ManagerLogger
+from manager import AppManager
+
+
+def load_dedup_index(name: str) -> DedupIndex:
+    """
+    Загружает индекс дедупликации в процессе сервиса дедупликации
+    """
+    return DataExecutor().load_dedup_index(name)
+
+
+class DedupManager(BaseManager):
+    """
+    Общий для всех шардов сервис дедупликации.
+    Индексы живут в одном процессе, шарды обращаются к ним через прокси
+    """
+    pass
+
+
+DedupManager.register(
+    'load_dedup_index', load_dedup_index,
+    exposed=('add', 'add_many', '__len__', '__contains__', 'memory_usage', 'report')
+)
+
+
+def split_owner_keys(keys: list, shard_index: int, workers_cnt: int) -> list:
+    """
+    Возвращает id и короткие имена владельцев для шарда. id делятся по abs(id) % workers_cnt, как в
+    ApiParser.in_shard. Короткие имена получает каждый шард: id известен только после запроса к vk api,
+    и после него шард оставляет только своих владельцев
+    """
+    return [key for key in keys or [] if not str(key).lstrip('-').isdigit()
+            or abs(int(key)) % workers_cnt == shard_index]
+
+
+def run_shard(queries: list[str], user_ids: list, group_ids: list, shard: tuple[int, int], include_stored: bool,
+              progress: JobProgress, cancel_event, indexes: dict, results: Queue) -> None:
+    """
+    Обходит стены владельцев одного шарда и возвращает найденных в репостах владельцев,
+    количество незаписанных пачек и ошибку обхода.
+    Записи владельцев из репостов в tOwners шард создает сам, чтобы посты из репостов записались вместе с владельцем
+    """
+    app_manager = AppManager(
+        AppConfig.get_vk_api_version(), AppConfig.get_vk_access_tokens(), queries,
+        progress, cancel_event, shard, indexes
+    )
+    app_manager.parser.follow_reposts = False
+    app_manager.parser.include_stored = include_stored
+    error = None
+    try:
+        app_manager.run(user_ids, group_ids)
+    except Exception as e:
+        error = repr(e)
+    crawled_ids = [owner.id for owner in app_manager.parser.search_owners]
+    results.put((crawled_ids, app_manager.parser.ext_user_ids, app_manager.parser.ext_group_ids,
+                 app_manager.writer.failed_cnt, error))
+
+
+def run_sharded(queries: list[str], user_ids: list, group_ids: list, progress: JobProgress = None,
+                cancel_event=None, job_id: str = None) -> None:
+    """
+    Обходит стены в несколько процессов.
+    Владельцы делятся между шардами, найденные в репостах владельцы обходятся следующим раундом.
+    Контрольные точки в этом режиме не сохраняются, job_id принимается для совместимости с start_service.
+    Если шард завершился с ошибкой или не записал пачку, следующий раунд не запускается и обход завершается ошибкой
+    """
+    logger = ManagerLogger()
+    workers_cnt = AppConfig.get_crawl_workers()
+    progress = progress if progress is not None else JobProgress()
+    with DedupManager() as dedup_manager:
+        indexes = {name: dedup_manager.load_dedup_index(name) for name in DataExecutor.dedup_models}
+        seen_ids = set()
+        include_stored = True
+        round_cnt = 1
+        failures = []
+        while user_ids or group_ids or include_stored:
+            logger.info(f'Sharded round {round_cnt}: {len(user_ids or [])} users, {len(group_ids or [])} groups')
+            results = Queue()
+            workers = []
+            for shard_index in range(workers_cnt):
+                shard_users = split_owner_keys(user_ids, shard_index, workers_cnt)
+                shard_groups = split_owner_keys(group_ids, shard_index, workers_cnt)
+                if not include_stored and not shard_users and not shard_groups:
+                    continue
+                worker = Process(
+                    target=run_shard,
+                    name=f'{current_process().name}.shard{shard_index}',
+                    args=(queries, shard_users, shard_groups, (shard_index, workers_cnt), include_stored,
+                          progress, cancel_event, indexes, results)
+                )
+                worker.start()
+                workers.append(worker)
+            ext_user_ids = set()
+            ext_group_ids = set()
+            pending_cnt = len(workers)
+            while pending_cnt:
+                try:
+                    crawled_ids, shard_ext_users, shard_ext_groups, failed_cnt, error = results.get(timeout=5)
+                except Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        failures.append(f'round {round_cnt}: {pending_cnt} workers exited without result')
+                        break
+                    continue
+                pending_cnt -= 1
+                if error is not None:
+                    failures.append(f'round {round_cnt}: shard error {error}')
+                if failed_cnt:
+                    failures.append(f'round {round_cnt}: {failed_cnt} batches failed')
+                seen_ids.update(crawled_ids)
+                ext_user_ids.update(shard_ext_users)
+                ext_group_ids.update(shard_ext_groups)
+            for worker in workers:
+                worker.join()
+                if worker.exitcode != 0:
+                    failures.append(f'round {round_cnt}: worker {worker.pid} exit code {worker.exitcode}')
+            if failures or cancel_event is not None and cancel_event.is_set():
+                break
+            user_ids = sorted(user_id for user_id in ext_user_ids if user_id not in seen_ids)
+            group_ids = sorted(group_id for group_id in ext_group_ids if -group_id not in seen_ids)
+            include_stored = False
+            round_cnt += 1
+        for name, index in indexes.items():
+            logger.info(index.report(name))
+    progress.set('finished', time.time())
+    if failures:
+        for failure in failures:
+            logger.error(f'Sharded crawl failed: {failure}')
+        raise RuntimeError(f'Sharded crawl failed: {"; ".join(failures)}')
@@ -0,0 +1,67 @@
+from threading import Thread
+
+from channel import END_OF_STREAM, LinkItem, PageChannel, PageMessage, PhotoItem, VideoItem, parse_wall_item
+
+
+def api_post(**fields):
+    post = {'id': 7, 'owner_id': -1, 'from_id': -1, 'date': 1_700_000_000, 'text': 'text', 'post_type': 'post',
+            'views': {'count': 10}, 'likes': {'count': 2}, 'marked_as_ads': 0, 'hash': 'unused'}
+    post.update(fields)
+    return post
+
+
+def test_wall_item_keeps_counters_and_drops_unknown_fields():
+    item = parse_wall_item(api_post())
+    assert (item.id, item.owner_id, item.type, item.views, item.likes, item.comments) == (7, -1, 'post', 10, 2, None)
+    assert not hasattr(item, '__dict__')
+
+
+def test_attachments_are_typed():
+    item = parse_wall_item(api_post(attachments=[
+        {'type': 'photo', 'photo': {'id': 1, 'owner_id': -1, 'date': 1, 'text': '',
+                                    'sizes': [{'width': 10, 'url': 'small'}, {'width': 600, 'url': 'large'}]}},
+        {'type': 'link', 'link': {'url': 'https://example.com', 'title': 'title'}},
+        {'type': 'video', 'video': {'id': 2, 'owner_id': -1, 'date': 1, 'title': 'video', 'views': 3}},
+        {'type': 'poll', 'poll': {}}
+    ]))
+    photo, link, video = item.attachments
+    assert isinstance(photo, PhotoItem) and photo.url == 'large'
+    assert isinstance(link, LinkItem) and link.description is None
+    assert isinstance(video, VideoItem) and video.views == 3
+
+
+def test_copy_history_is_parsed_recursively():
+    item = parse_wall_item(api_post(copy_history=[api_post(id=3, owner_id=-2, from_id=-2)]))
+    assert item.copy_history[0].owner_id == -2
+    assert item.copy_history[0].copy_history == []
+
+
+def test_channel_delivers_pages_then_end_of_stream():
+    channel = PageChannel(2)
+    channel.put_page('cursor', [parse_wall_item(api_post())], 100)
+    channel.close()
+    channel.close()
+    message = channel.get()
+    assert isinstance(message, PageMessage) and message.offset == 100
+    assert channel.get() is END_OF_STREAM
+
+
+def test_drain_waits_for_consumer():
+    channel = PageChannel(2)
+    channel.put_page('cursor', [], 100)
+    done = []
+    producer = Thread(target=lambda: (channel.drain(), done.append(True)))
+    producer.start()
+    producer.join(0.1)
+    assert not done
+    channel.get()
+    channel.task_done()
+    producer.join(1)
+    assert done
+
+
+def test_drain_returns_after_abort():
+    channel = PageChannel(2)
+    channel.put_page('cursor', [], 100)
+    channel.abort()
+    channel.drain()
@@ -0,0 +1,54 @@
+import random
+
+from dedup import DedupIndex, GroupedDedupIndex
+
+
+def test_add_reports_new_keys_only():
+    index = DedupIndex()
+    assert index.add(-1, 10)
+    assert not index.add(-1, 10)
+    assert index.add(1, 10)
+    assert len(index) == 2
+
+
+def test_add_many_matches_add():
+    index = DedupIndex([DedupIndex.pack(-1, 10)])
+    assert index.add_many([(-1, 10), (-1, 11), (-1, 11)]) == [False, True, False]
+    assert len(index) == 2
+
+
+def test_same_id_on_different_walls_is_distinct():
+    index = DedupIndex([DedupIndex.pack(-5, 1)])
+    assert index.add(-6, 1)
+    assert index.add(5, 1)
+    assert not index.add(-5, 1)
+
+
+def test_unsorted_keys_are_sorted_on_load():
+    index = DedupIndex([DedupIndex.pack(2, 1), DedupIndex.pack(-3, 7), DedupIndex.pack(1, 1)])
+    assert list(index._base) == sorted(index._base)
+    assert DedupIndex.pack(-3, 7) in index
+
+
+def test_merge_keeps_base_sorted_and_complete(monkeypatch):
+    monkeypatch.setattr(DedupIndex, 'merge_threshold', 100)
+    rnd = random.Random(1)
+    index = DedupIndex(sorted(DedupIndex.pack(owner_id, 1) for owner_id in range(-50, 50)))
+    expected = {(owner_id, 1) for owner_id in range(-50, 50)}
+    for _ in range(5000):
+        key = (rnd.randint(-100, 100), rnd.randint(0, 300))
+        assert index.add(*key) == (key not in expected)
+        expected.add(key)
+    assert len(index) == len(expected)
+    assert list(index._base) == sorted(index._base)
+    assert all(DedupIndex.pack(*key) in index for key in expected)
+
+
+def test_grouped_index_keys_by_group_and_wall():
+    index = GroupedDedupIndex([(1, DedupIndex.pack(-1, 10)), (1, DedupIndex.pack(-1, 11)),
+                               (2, DedupIndex.pack(-1, 10))])
+    assert len(index) == 3
+    assert index.add_many([(1, -1, 10), (1, -2, 10), (3, -1, 10), (3, -1, 10)]) == [False, True, True, False]
+    assert (3, DedupIndex.pack(-1, 10)) in index
+    assert index.memory_usage()['entries'] == 5
+    assert 'post_queries' in index.report('post_queries')
@@ -0,0 +1,43 @@
+import pytest
+
+from limiter import NoActiveTokensError, TokenBucket, TokenPool
+
+
+def test_bucket_allows_burst_then_waits():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.consume() == 0
+    assert bucket.consume() == 0
+    assert bucket.consume() == pytest.approx(0.1, abs=0.01)
+
+
+def test_penalize_delays_next_request():
+    bucket = TokenBucket(rate=10, capacity=3)
+    bucket.penalize(1.0)
+    assert bucket.delay() == pytest.approx(1.1, abs=0.01)
+
+
+def test_pool_prefers_least_loaded_token():
+    pool = TokenPool(['a' * 10, 'b' * 10], rate=10, capacity=1)
+    first, _ = pool.reserve()
+    second, _ = pool.reserve()
+    assert {first, second} == {'a' * 10, 'b' * 10}
+
+
+def test_auth_error_disables_token():
+    pool = TokenPool(['a' * 10, 'b' * 10], rate=10, capacity=1)
+    token, _ = pool.reserve()
+    pool.release(token, 5)
+    assert pool.active_cnt == 1
+    other, _ = pool.reserve()
+    assert other != token
+    pool.release(other, 29)
+    with pytest.raises(NoActiveTokensError):
+        pool.reserve()
+
+
+def test_rate_limit_error_throttles_token():
+    pool = TokenPool(['a' * 10], rate=10, capacity=1)
+    token, _ = pool.reserve()
+    pool.release(token, 6)
+    assert pool.active_cnt == 1
+    assert pool.buckets[token].delay() > 1.0
@@ -0,0 +1,29 @@
+import logging
+import os
+
+from logger import SizedTimedRotatingFileHandler
+
+
+def write_records(handler, count):
+    for i in range(count):
+        handler.emit(logging.LogRecord('test', logging.INFO, __file__, 0, f'record {i:04d}', None, None))
+
+
+def test_size_rollover_keeps_newest_backups(tmp_path):
+    handler = SizedTimedRotatingFileHandler(str(tmp_path / 'test.log'), max_bytes=1, when='midnight',
+                                            backupCount=2)
+    write_records(handler, 12)
+    handler.close()
+    backups = sorted(name for name in os.listdir(tmp_path) if name != 'test.log')
+    assert len(backups) == 2
+    assert [name.rsplit('.', 1)[1] for name in backups] == ['010', '011']
+
+
+def test_size_rollover_continues_numbering_after_restart(tmp_path):
+    for _ in range(2):
+        handler = SizedTimedRotatingFileHandler(str(tmp_path / 'test.log'), max_bytes=1, when='midnight',
+                                                backupCount=5)
+        write_records(handler, 3)
+        handler.close()
+    backups = sorted(name.rsplit('.', 1)[1] for name in os.listdir(tmp_path) if name != 'test.log')
+    assert backups == ['001', '002', '003', '004', '005']
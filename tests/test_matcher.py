@@ -0,0 +1,59 @@
+from matcher import TextMatcher
+
+
+def test_inflected_forms_match():
+    matcher = TextMatcher(['новости'])
+    assert matcher.find_all('Свежая новость дня')
+    assert matcher.find_all('Все НОВОСТИ')
+
+
+def test_e_and_yo_are_equal():
+    matcher = TextMatcher(['ёлка'])
+    assert matcher.find_all('Новогодняя елка')
+    assert TextMatcher(['елка']).find_all('Ёлка на площади')
+
+
+def test_match_starts_at_word_start():
+    matcher = TextMatcher(['видео'])
+    assert matcher.find_all('новое видео')
+    assert not matcher.find_all('супервидео')
+
+
+def test_short_words_do_not_match_on_their_own():
+    matcher = TextMatcher(['новости в Анапе'])
+    assert not matcher.find_all('в городе прошел дождь')
+    assert not matcher.find_all('Анапа встречает гостей')
+
+
+def test_phrase_matches_as_sequence():
+    matcher = TextMatcher(['новости в Анапе'])
+    text = 'Главные новости в Анапе за неделю'
+    hits = matcher.find_all(text)
+    assert len(hits) == 1
+    assert text[hits[0][0]:hits[0][1]].startswith('новости в Анап')
+    assert matcher.find_all('Новостей в Анапе нет')
+    assert matcher.find_all('Новости Анапе')
+    assert not matcher.find_all('новости из далекой Анапе')
+
+
+def test_phrase_words_must_be_adjacent():
+    matcher = TextMatcher(['курс доллара'])
+    assert matcher.find_all('Курс доллара вырос')
+    assert not matcher.find_all('доллар и курс')
+
+
+def test_short_only_query_matches_whole_words():
+    matcher = TextMatcher(['ВК'])
+    assert matcher.find_all('новости ВК')
+    assert not matcher.find_all('вконтакте')
+
+
+def test_several_queries_in_one_pass():
+    matcher = TextMatcher(['Путин', 'видео'])
+    assert len(matcher.find_all('Путин посмотрел видео')) == 2
+
+
+def test_fragment_merges_windows_and_limits_count():
+    matcher = TextMatcher(['кот'], window=3, max_fragments=1)
+    assert matcher.fragment('мой кот и кот') == 'ой кот и кот'
+    assert matcher.fragment('без совпадений') is None
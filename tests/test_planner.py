@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+from planner import BatchPlanner
+
+
+def cursor(total_cnt=None, offset=0):
+    return SimpleNamespace(total_cnt=total_cnt, offset=offset)
+
+
+def test_expected_posts_uses_remaining_count():
+    assert BatchPlanner.expected_posts(cursor(), 100) == 100
+    assert BatchPlanner.expected_posts(cursor(total_cnt=250, offset=200), 100) == 50
+    assert BatchPlanner.expected_posts(cursor(total_cnt=100, offset=100), 100) == 0
+
+
+def test_batches_respect_call_limit():
+    planner = BatchPlanner(max_calls=25, max_response_size=10 ** 9, post_size=100)
+    batches = planner.plan([cursor() for _ in range(60)], 100)
+    assert [len(batch) for batch in batches] == [25, 25, 10]
+
+
+def test_batches_respect_response_size():
+    planner = BatchPlanner(max_calls=25, max_response_size=3 * (200 + 100 * 100), post_size=100)
+    batches = planner.plan([cursor() for _ in range(7)], 100)
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+
+
+def test_small_calls_fill_gaps_of_large_batches():
+    planner = BatchPlanner(max_calls=25, max_response_size=200 + 100 * 100 + 2 * (200 + 100), post_size=100)
+    cursors = [cursor(), cursor(total_cnt=1), cursor(total_cnt=1)]
+    batches = planner.plan(cursors, 100)
+    assert len(batches) == 1
+    assert sum(len(batch) for batch in batches) == 3
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+from registry import OwnerRegistry
+
+
+def owner(_id, domain, is_active=True):
+    return SimpleNamespace(id=_id, domain=domain, is_active=is_active)
+
+
+def test_add_rejects_known_id():
+    registry = OwnerRegistry()
+    assert registry.add(owner(1, 'durov'))
+    assert not registry.add(owner(1, 'other'))
+    assert len(registry) == 1
+    assert 1 in registry
+
+
+def test_has_key_by_id_and_domain():
+    registry = OwnerRegistry()
+    registry.add(owner(1, 'Durov'))
+    registry.add(owner(-22, 'club22'))
+    assert registry.has_key('1')
+    assert registry.has_key('durov')
+    assert registry.has_key(22, is_group=True)
+    assert not registry.has_key(22)
+    assert not registry.has_key('unknown')
+
+
+def test_active_owners_and_deactivate():
+    registry = OwnerRegistry()
+    first = owner(1, 'a')
+    registry.add(first)
+    registry.add(owner(2, 'b', is_active=False))
+    registry.add(owner(3, 'c'))
+    assert registry.active_cnt == 2
+    assert registry.deactivate(first)
+    assert not registry.deactivate(first)
+    assert [item.id for item in registry.active()] == [3]
+
+
+def test_pop_unexported_skips_exported_owners():
+    registry = OwnerRegistry()
+    registry.add(owner(1, 'a'), exported=True)
+    registry.add(owner(2, 'b'))
+    assert [item.id for item in registry.pop_unexported()] == [2]
+    assert registry.pop_unexported() == []
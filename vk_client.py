@@ -0,0 +1,132 @@
+import asyncio
+from time import perf_counter
+
+import aiohttp
+from vk_api.exceptions import ApiError, ApiHttpError
+
+from limiter import TokenPool
+from metrics import CrawlMetrics
+
+
+class AsyncApiHttpError(ApiHttpError):
+    """
+    Ошибка HTTP или сети при асинхронном запросе к vk api
+    """
+
+    def __init__(self, method: str, values: dict, status_code=None, reason=None):
+        self.method = method
+        self.values = values
+        self.status_code = status_code
+        self.reason = reason
+
+    def __str__(self):
+        if self.status_code is None:
+            return f'Connection error: {self.reason}'
+        return f'Response code {self.status_code}'
+
+
+class ApiStats:
+    """
+    Счетчики задержки и пропускной способности запросов к vk api
+    """
+
+    def __init__(self, metrics: CrawlMetrics = None):
+        self.metrics = metrics
+        self.started = perf_counter()
+        self.requests_cnt = 0
+        self.errors_cnt = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def add(self, latency: float, is_error: bool = False, script: str = 'execute') -> None:
+        """
+        Учитывает один запрос, script - вызываемые скриптом методы для метрик
+        """
+        if self.metrics is not None:
+            self.metrics.observe_api(script, latency)
+        self.requests_cnt += 1
+        self.errors_cnt += int(is_error)
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def report(self) -> str:
+        """
+        Возвращает строку со средней задержкой и количеством запросов в секунду
+        """
+        elapsed = perf_counter() - self.started
+        avg_latency = self.total_latency / self.requests_cnt if self.requests_cnt else 0.0
+        throughput = self.requests_cnt / elapsed if elapsed else 0.0
+        return (f'API requests: {self.requests_cnt}, errors: {self.errors_cnt}, '
+                f'avg latency: {avg_latency:.3f} s, max latency: {self.max_latency:.3f} s, '
+                f'throughput: {throughput:.2f} req/s')
+
+
+class AsyncVkClient:
+    """
+    Асинхронный клиент vk api с пулом keep-alive соединений
+    """
+    api_url = 'https://api.vk.com/method/'
+
+    def __init__(self, token_pool: TokenPool, version: str, concurrency: int, metrics: CrawlMetrics = None):
+        self.token_pool = token_pool
+        self.version = version
+        self.concurrency = concurrency
+        self.stats = ApiStats(metrics)
+        self._session = None
+        self._semaphore = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Возвращает общую сессию, создает ее при первом обращении
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=60)
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def method(self, method: str, values: dict, script: str = 'execute', return_raw: bool = False):
+        """
+        Вызывает метод vk api и возвращает поле response, при return_raw=True - весь ответ
+        """
+        session = self._get_session()
+        async with self._semaphore:
+            token = await self.token_pool.acquire_async()
+            headers = {'Authorization': 'Bearer ' + token}
+            start = perf_counter()
+            try:
+                async with session.post(self.api_url + method, data={**values, 'v': self.version},
+                                        headers=headers) as resp:
+                    if resp.status != 200:
+                        raise AsyncApiHttpError(method, values, status_code=resp.status)
+                    raw = await resp.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.stats.add(perf_counter() - start, True, script)
+                self.token_pool.release(token)
+                raise AsyncApiHttpError(method, values, reason=repr(e)) from e
+            except AsyncApiHttpError:
+                self.stats.add(perf_counter() - start, True, script)
+                self.token_pool.release(token)
+                raise
+            self.stats.add(perf_counter() - start, 'error' in raw, script)
+            self.token_pool.release(token, raw['error'].get('error_code') if 'error' in raw else None)
+        if 'error' in raw:
+            raise ApiError(None, method, values, raw, raw['error'])
+        return raw if return_raw else raw['response']
+
+    async def execute_many(self, codes: list[str], script: str = 'execute') -> list:
+        """
+        Параллельно выполняет несколько скриптов execute, возвращает полные ответы с полем execute_errors.
+        Ошибки возвращаются в списке результатов вместо ответа
+        """
+        tasks = [self.method('execute', {'code': code}, script, return_raw=True) for code in codes]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def close(self) -> None:
+        """
+        Закрывает сессию
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -0,0 +1,115 @@
+from datetime import datetime
+from queue import Queue
+from threading import Thread
+
+from executors import DataExecutor
+from logger import ManagerLogger
+from records import OwnerRecord, PostRecord, PostQueryRecord, to_state, from_state
+
+
+class StreamWriter:
+    """
+    Потоковая запись результатов парсинга в базу данных пачками.
+    Очередь пачек ограничена, поэтому при отставании записи поставщик блокируется.
+    Посты владельцев, которые еще не записаны в базу, откладываются до записи владельца.
+    Контрольная точка обхода сохраняется после записи пачки вместе с отложенными постами.
+    """
+
+    def __init__(self, executor: DataExecutor, logger: ManagerLogger, max_pending_batches: int,
+                 job_id: str = None):
+        self.executor = executor
+        self.job_id = job_id
+        self.logger = logger
+        self.queue = Queue(maxsize=max_pending_batches)
+        self.owner_ids = set(executor.get_owner_ids())
+        self.deferred_posts = []
+        self.batch_cnt = 0
+        self.rows_cnt = 0
+        self.failed_cnt = 0
+        self.checkpoint_cnt = 0
+        self.thread = Thread(target=self._run, daemon=True)
+
+    def restore(self, state: dict) -> None:
+        """
+        Восстанавливает отложенные посты из контрольной точки
+        """
+        self.deferred_posts = [from_state(PostRecord, post) for post in state.get('deferred_posts', [])]
+
+    def start(self) -> None:
+        """
+        Запускает поток записи
+        """
+        self.thread.start()
+
+    def write(self, owners: list[OwnerRecord], posts: list[PostRecord], post_queries: list[PostQueryRecord],
+              checkpoint: dict = None) -> None:
+        """
+        Ставит пачку в очередь на запись. checkpoint - состояние обхода, которое сохраняется после записи пачки
+        """
+        if owners or posts or post_queries or checkpoint is not None:
+            self.queue.put((owners, posts, post_queries, checkpoint))
+
+    def close(self) -> None:
+        """
+        Останавливает поток записи. Посты, владельцы которых так и не записаны, не пишутся:
+        внешний ключ tPosts.owner_id не даст их записать, они остаются в контрольной точке
+        """
+        self.queue.put(None)
+        self.thread.join()
+        if self.deferred_posts:
+            self.logger.warning(f"Writer: {len(self.deferred_posts)} posts without owner are not written")
+        self.logger.info(f"Writer: batches {self.batch_cnt}, rows {self.rows_cnt}, failed {self.failed_cnt}, "
+                         f"checkpoints {self.checkpoint_cnt}")
+
+    def _run(self) -> None:
+        """
+        Цикл потока записи
+        """
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+            owners, posts, post_queries, checkpoint = batch
+            self.owner_ids.update(owner.id for owner in owners)
+            ready_posts = []
+            deferred_posts = []
+            for post in self.deferred_posts + posts:
+                if post.owner_id in self.owner_ids:
+                    ready_posts.append(post)
+                else:
+                    deferred_posts.append(post)
+            self.deferred_posts = deferred_posts
+            flushed = self._flush(owners, ready_posts, post_queries)
+            if flushed and checkpoint is not None and not self.failed_cnt:
+                self._save_checkpoint(dict(checkpoint, deferred_posts=[to_state(post) for post in deferred_posts]))
+
+    def _save_checkpoint(self, checkpoint: dict) -> None:
+        """
+        Сохраняет контрольную точку, ошибка сохранения не останавливает запись
+        """
+        try:
+            self.executor.save_checkpoint(self.job_id, checkpoint)
+            self.checkpoint_cnt += 1
+        except Exception as e:
+            self.logger.error(f"Writer: checkpoint failed: {e}")
+
+    def _flush(self, owners: list[OwnerRecord], posts: list[PostRecord], post_queries: list[PostQueryRecord]) -> bool:
+        """
+        Записывает одну пачку и логирует время записи. Возвращает False, если запись не удалась
+        """
+        if not owners and not posts and not post_queries:
+            return True
+        start = datetime.now()
+        try:
+            self.executor.write(owners, posts, post_queries)
+        except Exception as e:
+            self.failed_cnt += 1
+            self.logger.error(f"Writer: batch {self.batch_cnt + 1} failed: {e}")
+            return False
+        self.batch_cnt += 1
+        self.rows_cnt += len(owners) + len(posts) + len(post_queries)
+        self.logger.info(
+            f"Writer: batch {self.batch_cnt} owners {len(owners)} posts {len(posts)} queries {len(post_queries)} "
+            f"time {datetime.now() - start} queue {self.queue.qsize()}"
+        )
+        return True